@@ -0,0 +1,64 @@
+import sys
+import os
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.search.ann import IVFIndex, normalize_rows
+
+DOCUMENT_COUNT = 100000
+DIMENSIONS = 384  # all-MiniLM-L6-v2 embedding size
+TOPICS = 500
+QUERY_COUNT = 100
+TOP_K = 10
+
+def make_embeddings(rng, count):
+    # Sentence embeddings cluster by topic, so sample around random topic
+    # centres; quantization_benchmark.py uses the same corpus
+    topics = rng.standard_normal((TOPICS, DIMENSIONS)).astype(np.float32)
+    labels = rng.integers(0, TOPICS, count)
+    noise = rng.standard_normal((count, DIMENSIONS)).astype(np.float32)
+    return topics[labels] + 0.8 * noise
+
+def brute_force(matrix, query, k):
+    scores = matrix @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+def main():
+    rng = np.random.default_rng(0)
+    embeddings = make_embeddings(rng, DOCUMENT_COUNT)
+    queries = make_embeddings(rng, QUERY_COUNT)
+    normalized = normalize_rows(embeddings)
+
+    print(f"{DOCUMENT_COUNT} vectors of {DIMENSIONS} dimensions, top {TOP_K} of {QUERY_COUNT} queries")
+
+    start_time = time.time()
+    exact = [set(brute_force(normalized, query / np.linalg.norm(query), TOP_K).tolist()) for query in queries]
+    exact_time = (time.time() - start_time) / QUERY_COUNT
+    print(f"\nBrute force: {exact_time * 1000:.2f} ms per query")
+
+    start_time = time.time()
+    ann_index = IVFIndex()
+    ann_index.train(embeddings)
+    ann_index.add(range(DOCUMENT_COUNT), embeddings)
+    print(f"IVF build ({len(ann_index.lists)} lists): {time.time() - start_time:.2f} s")
+
+    print(f"\n{'n_probe':>8} {'Per query (ms)':>15} {'Speedup':>8} {'Recall@' + str(TOP_K):>10}")
+    for n_probe in [1, 2, 4, 8, 16, 32, 64]:
+        start_time = time.time()
+        found = [set(ann_index.search(normalized, query, TOP_K, n_probe)[0].tolist()) for query in queries]
+        query_time = (time.time() - start_time) / QUERY_COUNT
+
+        recall = sum(len(expected & result) for expected, result in zip(exact, found)) / (TOP_K * QUERY_COUNT)
+        print(f"{n_probe:>8} {query_time * 1000:>15.2f} {exact_time / query_time:>7.1f}x {recall:>10.3f}")
+
+    # Incremental insertion files new vectors under the existing centroids
+    extra = make_embeddings(rng, 10000)
+    start_time = time.time()
+    ann_index.add(range(DOCUMENT_COUNT, DOCUMENT_COUNT + len(extra)), extra)
+    print(f"\nIncremental insert of {len(extra)} vectors: {time.time() - start_time:.3f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import sys
+import os
+import random
+import string
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.search.fuzzy_search import FuzzySearch
+from src.indexing.inverted_index import InvertedIndex
+from src.indexing.tokenizer import Tokenizer
+
+VOCABULARY_SIZE = 20000
+WORDS_PER_DOCUMENT = 20
+QUERY_COUNT = 50
+
+def random_word(rng):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+
+def misspell(word, rng):
+    # Apply one or two random edits
+    for _ in range(rng.randint(1, 2)):
+        position = rng.randrange(len(word))
+        edit = rng.choice(['insert', 'delete', 'replace'])
+        if edit == 'insert':
+            word = word[:position] + rng.choice(string.ascii_lowercase) + word[position:]
+        elif edit == 'delete' and len(word) > 1:
+            word = word[:position] + word[position + 1:]
+        else:
+            word = word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:]
+    return word
+
+def main():
+    rng = random.Random(42)
+    vocabulary = [random_word(rng) for _ in range(VOCABULARY_SIZE)]
+
+    documents = []
+    for start in range(0, len(vocabulary), WORDS_PER_DOCUMENT):
+        documents.append(' '.join(vocabulary[start:start + WORDS_PER_DOCUMENT]))
+
+    tokenizer = Tokenizer(remove_stopwords=True)
+    index = InvertedIndex(tokenizer=tokenizer, use_lemmatization=False)
+
+    print(f"Indexing {len(documents)} documents...")
+    index.add_documents(enumerate(documents))
+    terms = list(index.index.keys())
+    all_terms = set(terms)
+    print(f"Vocabulary size: {len(terms)} terms")
+
+    queries = [misspell(rng.choice(terms), rng) for _ in range(QUERY_COUNT)]
+
+    backends = {}
+    for backend in ['linear', 'bktree', 'trie', 'symspell']:
+        search = FuzzySearch(index=index, max_distance=2, backend=backend)
+
+        start_time = time.time()
+        if backend == 'bktree':
+            search.build_bktree()
+        elif backend == 'trie':
+            search.build_trie()
+        elif backend == 'symspell':
+            search.build_deletion_index()
+        build_time = time.time() - start_time
+
+        start_time = time.time()
+        matches = [set(search._get_fuzzy_matches(query, all_terms)) for query in queries]
+        query_time = (time.time() - start_time) / len(queries)
+
+        backends[backend] = (build_time, query_time, matches)
+
+    print(f"\n{'Backend':<8} {'Build (s)':>10} {'Per query (ms)':>15} {'Speedup':>8}")
+    linear_time = backends['linear'][1]
+    for backend, (build_time, query_time, matches) in backends.items():
+        print(f"{backend:<8} {build_time:>10.3f} {query_time * 1000:>15.3f} {linear_time / query_time:>7.1f}x")
+
+    reference = backends['linear'][2]
+    for backend in ['bktree', 'trie', 'symspell']:
+        matches = backends[backend][2]
+        agree = sum(1 for expected, found in zip(reference, matches) if expected == found)
+        print(f"{backend} agrees with linear scan on {agree}/{len(queries)} queries")
+
+if __name__ == "__main__":
+    main()
@@ -60,6 +60,12 @@ def main():
     results = search.search("effects")
     display_results(results)
     
+    # The algorithm can be switched per query without rebuilding
+    for algorithm in ["metaphone", "soundex", "double_metaphone"]:
+        print(f"\nPhonetic search for 'fone' using {algorithm}:")
+        results = search.search("fone", algorithm=algorithm)
+        display_results(results)
+
     # Display phonetic matches for some terms
     print("\nPhonetically similar terms for 'phone':")
     matches = search.get_phonetic_matches("phone")
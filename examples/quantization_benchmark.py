@@ -0,0 +1,56 @@
+import sys
+import os
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.search.ann import normalize_rows
+from src.search.quantization import quantize, dequantize, score_rows
+from ann_benchmark import DIMENSIONS, make_embeddings
+
+DOCUMENT_COUNT = 200000
+QUERY_COUNT = 50
+TOP_K = 10
+RESCORE = 50
+
+def top(scores, k):
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best])]
+
+def main():
+    rng = np.random.default_rng(0)
+    embeddings = normalize_rows(make_embeddings(rng, DOCUMENT_COUNT))
+    queries = normalize_rows(make_embeddings(rng, QUERY_COUNT))
+    exact = [set(top(embeddings @ query, TOP_K).tolist()) for query in queries]
+
+    print(f"{DOCUMENT_COUNT} vectors of {DIMENSIONS} dimensions, top {TOP_K} of {QUERY_COUNT} queries")
+    print(f"\n{'Storage':<8} {'Memory (MB)':>12} {'Per query (ms)':>15} {'Recall@' + str(TOP_K):>10} "
+          f"{'Rescored recall':>16} {'Max score error':>16}")
+
+    for storage in ['float32', 'float16', 'int8']:
+        rows, scales = quantize(embeddings, storage)
+        memory = rows.nbytes + (scales.nbytes if scales is not None else 0)
+
+        start_time = time.time()
+        found = [top(score_rows(rows, query, scales), max(TOP_K, RESCORE)) for query in queries]
+        query_time = (time.time() - start_time) / QUERY_COUNT
+
+        recall = sum(len(expected & set(candidates[:TOP_K].tolist()))
+                     for expected, candidates in zip(exact, found)) / (TOP_K * QUERY_COUNT)
+
+        # Re-rank the best RESCORE candidates with the exact float32 vectors
+        rescored = 0
+        for expected, candidates, query in zip(exact, found, queries):
+            reranked = candidates[np.argsort(-(embeddings[candidates] @ query))][:TOP_K]
+            rescored += len(expected & set(reranked.tolist()))
+        rescored_recall = rescored / (TOP_K * QUERY_COUNT)
+
+        error = np.abs(dequantize(rows[:1000], scales[:1000] if scales is not None else None) @ queries[0]
+                       - embeddings[:1000] @ queries[0]).max()
+
+        print(f"{storage:<8} {memory / 2**20:>12.1f} {query_time * 1000:>15.2f} {recall:>10.3f} "
+              f"{rescored_recall:>16.3f} {error:>16.5f}")
+
+if __name__ == "__main__":
+    main()
@@ -31,6 +31,12 @@ def main():
     print("\nSearch for 'search engine' (ranked):")
     results = search.search("search engine", rank=True)
     display_results(results)
+    
+    bm25_search = BasicSearch(index=search.index, ranking="bm25")
+    
+    print("\nTop 3 for 'python machine learning' (BM25, OR):")
+    results = bm25_search.search("python machine learning", mode="OR", limit=3)
+    display_results(results)
 
 def display_results(results):
     if not results:
@@ -0,0 +1,84 @@
+import sys
+import os
+import time
+import random
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.indexing.tokenizer import Tokenizer
+
+DOCUMENT_COUNT = 5000
+WORDS_PER_DOCUMENT = 40
+BATCH_SIZE = 1000
+
+SENTENCES = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Deep learning is a subset of machine learning with neural networks.",
+    "Paris is the capital of France and known for the Eiffel Tower.",
+    "Machine learning algorithms learn patterns from data to make predictions.",
+    "Climate change is causing rising sea levels and extreme weather events.",
+    "Python is a popular programming language for data science and ML.",
+    "Natural language processing helps computers understand human language.",
+    "The Louvre Museum in Paris houses the Mona Lisa painting.",
+    "Researchers were studying how the children learned languages faster.",
+    "The engineers built bridges that survived the strongest storms.",
+    "She was reading the books her grandparents had written years ago.",
+    "Cloud computing provides computing services over the internet."
+]
+
+def make_documents(rng, count):
+    # Shuffle words of real sentences so documents share a Zipf-like vocabulary
+    words = " ".join(SENTENCES).split()
+    return [" ".join(rng.choices(words, k=WORDS_PER_DOCUMENT)) for _ in range(count)]
+
+def timed(function):
+    start_time = time.time()
+    result = function()
+    return result, time.time() - start_time
+
+def main():
+    rng = random.Random(0)
+    documents = make_documents(rng, DOCUMENT_COUNT)
+
+    # The existing path: one lemmatize() call per document through the whole model
+    full = Tokenizer(cache_size=0)
+    expected, baseline_time = timed(lambda: [full.lemmatize(document) for document in documents])
+
+    print(f"{DOCUMENT_COUNT} documents of {WORDS_PER_DOCUMENT} words")
+    print(f"\n{'Analysis':<28} {'Docs/s':>10} {'Speedup':>8} {'Same lemmas':>12} {'Memo size':>10}")
+    print(f"{'lemmatize(), full':<28} {DOCUMENT_COUNT / baseline_time:>10.0f} {1.0:>8.1f} {1.0:>12.3f} {'-':>10}")
+
+    configurations = [
+        ("pipe(), full", dict(pipeline="full")),
+        ("pipe(), fast", dict(pipeline="fast")),
+        ("pipe(), fast + memo", dict(pipeline="fast", memoize_lemmas=True)),
+        ("pipe(), lookup", dict(pipeline="lookup")),
+    ]
+
+    for name, options in configurations:
+        try:
+            tokenizer = Tokenizer(cache_size=0, **options)
+        except (ImportError, ValueError) as error:
+            # The lookup pipeline needs spacy-lookups-data
+            print(f"{name:<28} skipped: {error}")
+            continue
+
+        lemmas, elapsed = timed(lambda: list(tokenizer.pipe(documents, batch_size=BATCH_SIZE)))
+        agreement = sum(1 for got, want in zip(lemmas, expected) if got == want) / DOCUMENT_COUNT
+        memo_size = len(tokenizer.lemma_memo) if tokenizer.memoize_lemmas else "-"
+
+        print(f"{name:<28} {DOCUMENT_COUNT / elapsed:>10.0f} {baseline_time / elapsed:>8.1f} "
+              f"{agreement:>12.3f} {memo_size:>10}")
+
+    # Queries are short and repeat, so they are served from the memo and LRU cache
+    queries = [" ".join(rng.choices(SENTENCES[0].split(), k=3)) for _ in range(1000)]
+    print(f"\n{'Query analysis':<28} {'Per query (us)':>15}")
+    for name, tokenizer in [("full", Tokenizer(cache_size=0)),
+                            ("full + LRU cache", Tokenizer()),
+                            ("fast + memo", Tokenizer(pipeline="fast", memoize_lemmas=True))]:
+        list(tokenizer.pipe(documents[:BATCH_SIZE]))  # Warm the memo as ingestion would
+        _, elapsed = timed(lambda: [tokenizer.lemmatize(query) for query in queries])
+        print(f"{'lemmatize(), ' + name:<28} {elapsed / len(queries) * 1e6:>15.0f}")
+
+if __name__ == "__main__":
+    main()
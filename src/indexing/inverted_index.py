@@ -1,22 +1,70 @@
-from collections import defaultdict
-from .tokenizer import Tokenizer
+import threading
+from array import array
+from collections import Counter
+from .postings import PostingsList, intersect_all
+from .segment import Segment, SegmentedPostings
+from .storage import read_segment, write_segment
+from .tokenizer import Tokenizer, iter_batches
+
+
+def _within_distance(first_positions, second_positions, distance):
+    # Walk both sorted position lists together, always advancing the smaller
+    i = j = 0
+    while i < len(first_positions) and j < len(second_positions):
+        first, second = first_positions[i], second_positions[j]
+        if abs(first - second) <= distance:
+            return True
+        if first < second:
+            i += 1
+        else:
+            j += 1
+    return False
+
 
 class InvertedIndex:
     """
     Implementation of an inverted index, which maps terms to the documents 
     that contain them.
+    
+    Postings are kept in segments, LSM style: new documents go into a small
+    mutable segment, which is sealed once it holds segment_size documents.
+    Sealed segments are immutable and get merged into larger ones in the
+    background, so adding a document never touches a large structure.
+    Lookups fan out across all segments and concatenate the results.
     """
     
-    def __init__(self, tokenizer=None, use_lemmatization=True):
+    def __init__(self, tokenizer=None, use_lemmatization=True, segment_size=10000,
+                 merge_factor=4, background_merge=True):
         """
         Initialize the inverted index.
         
         Args:
             tokenizer: The tokenizer to use for processing text
             use_lemmatization: Whether to use lemmatization instead of just tokenization
+            segment_size: Number of documents after which the mutable segment is sealed
+            merge_factor: Number of sealed segments of the same size tier that
+                          get merged into one
+            background_merge: Whether to merge segments on a background thread
+                              instead of inline while adding documents
         """
-        self.index = defaultdict(set)  # Term -> set of doc_ids
+        self.segments = []  # Sealed segments, in document number order
+        self.active_segment = Segment(0)  # Mutable segment receiving new documents
+        self.segment_size = segment_size
+        self.merge_factor = merge_factor
+        self.background_merge = background_merge
+        self._merge_lock = threading.Lock()
+        self._merge_thread = None
+        self.index = SegmentedPostings(self)  # Term -> PostingsList of document numbers
+        self.doc_freqs = {}  # Term -> number of documents containing it
+        self.doc_ids = []  # Document number -> doc_id, None once deleted or replaced
+        self.deleted_docs = set()  # Tombstoned document numbers still present in postings
+        self.doc_numbers = {}  # doc_id -> dense document number
         self.documents = {}  # doc_id -> original content
+        self.term_freqs = {}  # doc_id -> term -> frequency
+        self.positions = {}  # doc_id -> term -> sorted token positions
+        self.doc_lengths = {}  # doc_id -> number of indexed tokens
+        self.total_length = 0  # Sum of all document lengths
+        self.term_bounds = {}  # term -> (max frequency, min document length) over its postings
         self.tokenizer = tokenizer or Tokenizer()
         self.use_lemmatization = use_lemmatization
     
@@ -28,35 +76,425 @@ class InvertedIndex:
             doc_id: A unique identifier for the document
             content: The document's text content
         """
+        self._index_tokens(doc_id, content, self.analyze(content, use_cache=False))
+    
+    def add_documents(self, documents, batch_size=1000, n_process=1):
+        """
+        Add many documents to the index, streaming them through spaCy in batches.
+        
+        Args:
+            documents: An iterable of (doc_id, content) pairs
+            batch_size: Number of documents analyzed and indexed per batch
+            n_process: Number of processes spaCy uses for the analysis
+        """
+        for _ in self.index_batches(documents, batch_size=batch_size, n_process=n_process):
+            pass
+    
+    def index_batches(self, documents, batch_size=1000, n_process=1, with_replaced=False):
+        """
+        Add documents to the index batch by batch, yielding each batch once
+        its postings are in place so callers can update derived structures.
+        
+        Args:
+            documents: An iterable of (doc_id, content) pairs
+            batch_size: Number of documents analyzed and indexed per batch
+            n_process: Number of processes spaCy uses for the analysis
+            with_replaced (bool): Whether to also yield the terms of the
+                                  document versions the batch replaced
+            
+        Yields:
+            list: The (doc_id, content) pairs of the batch just indexed, or
+                  (batch, replaced) pairs with with_replaced, where replaced
+                  maps each re-added doc_id to the set of terms of the
+                  versions it replaced, including earlier copies in the
+                  same batch
+        """
+        analyzed = self.tokenizer.pipe(
+            ((content, (doc_id, content)) for doc_id, content in documents),
+            lemmatize=self.use_lemmatization,
+            batch_size=batch_size,
+            n_process=n_process,
+            as_tuples=True
+        )
+        
+        for batch in iter_batches(analyzed, batch_size):
+            replaced = {}
+            for tokens, (doc_id, content) in batch:
+                replaced_terms = self._index_tokens(doc_id, content, tokens)
+                if replaced_terms is not None:
+                    replaced.setdefault(doc_id, set()).update(replaced_terms)
+            
+            pairs = [pair for _, pair in batch]
+            yield (pairs, replaced) if with_replaced else pairs
+    
+    def _index_tokens(self, doc_id, content, tokens):
+        # Returns the terms of the version this document replaces, if any
+        replaced_terms = None
+        if doc_id in self.doc_numbers:
+            # Re-adding a document replaces it under a new document number
+            replaced_terms = list(self.term_freqs[doc_id])
+            self._retire(doc_id)
+        
         self.documents[doc_id] = content
         
-        if self.use_lemmatization:
-            tokens = self.tokenizer.lemmatize(content)
-        else:
-            tokens = self.tokenizer.tokenize(content)
+        doc_num = len(self.doc_ids)
+        self.doc_numbers[doc_id] = doc_num
+        self.doc_ids.append(doc_id)
+        
+        term_counts = Counter(tokens)
+        self.term_freqs[doc_id] = dict(term_counts)
+        
+        doc_positions = {}
+        for position, token in enumerate(tokens):
+            if token not in doc_positions:
+                doc_positions[token] = array("I")
+            doc_positions[token].append(position)
+        self.positions[doc_id] = doc_positions
+        self.doc_lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+        
+        self.active_segment.add(doc_num, term_counts)
+        if self.active_segment.doc_count >= self.segment_size:
+            self._seal_active_segment()
+        
+        for token, count in term_counts.items():
+            self.doc_freqs[token] = self.doc_freqs.get(token, 0) + 1
+            
+            # Keep the statistics rankers use to bound a term's best possible score
+            max_freq, min_length = self.term_bounds.get(token, (0, len(tokens)))
+            self.term_bounds[token] = (max(max_freq, count), min(min_length, len(tokens)))
+        
+        return replaced_terms
+    
+    def delete_document(self, doc_id):
+        """
+        Delete a document from the index.
+        
+        The document's number is tombstoned: its statistics are removed right
+        away, and its postings are skipped when resolving results until they
+        are dropped by compact() or a segment merge.
+        
+        Args:
+            doc_id: The document ID
+            
+        Returns:
+            bool: Whether the document was in the index
+        """
+        if doc_id not in self.doc_numbers:
+            return False
+        
+        self._retire(doc_id)
+        return True
+    
+    def update_document(self, doc_id, content):
+        """
+        Replace a document's content. The old version is tombstoned and the
+        new one indexed under a new document number.
+        
+        Args:
+            doc_id: The document ID
+            content: The document's new text content
+        """
+        self.add_document(doc_id, content)
+    
+    def compact(self):
+        """
+        Reclaim the postings of deleted documents in every segment, without
+        re-analyzing or re-merging anything else.
+        """
+        self.wait_for_merges()
+        
+        with self._merge_lock:
+            deleted = self.deleted_docs
+            self.segments = [segment.without(deleted) for segment in self.segments]
+            self.active_segment = self.active_segment.without(deleted)
+            self.deleted_docs = set()
+        
+        for term in [term for term in self.term_bounds if term not in self.doc_freqs]:
+            del self.term_bounds[term]
+    
+    def _retire(self, doc_id):
+        # Forget the document's number and statistics; its stale postings are
+        # skipped when resolving document numbers
+        self.total_length -= self.doc_lengths[doc_id]
+        
+        for term in self.term_freqs[doc_id]:
+            self.doc_freqs[term] -= 1
+            if not self.doc_freqs[term]:
+                del self.doc_freqs[term]
+        
+        for store in (self.documents, self.term_freqs, self.positions, self.doc_lengths):
+            del store[doc_id]
+        
+        doc_num = self.doc_numbers.pop(doc_id)
+        self.doc_ids[doc_num] = None
+        self.deleted_docs.add(doc_num)
+    
+    def all_segments(self):
+        """
+        Get a snapshot of the segments to search.
+        
+        Returns:
+            list: The sealed segments followed by the mutable one
+        """
+        return self.segments + [self.active_segment]
+    
+    def doc_freq(self, term):
+        """
+        Get the number of documents containing an analyzed term.
+        
+        Args:
+            term: The analyzed term
+            
+        Returns:
+            int: The document frequency
+        """
+        return self.doc_freqs.get(term, 0)
+    
+    def _seal_active_segment(self):
+        with self._merge_lock:
+            self.active_segment.seal()
+            self.segments = self.segments + [self.active_segment]
+            self.active_segment = Segment(len(self.doc_ids))
+        
+        if not self.background_merge:
+            self._merge_segments()
+            return
+        
+        with self._merge_lock:
+            if self._merge_thread is not None and self._merge_thread.is_alive():
+                return
+            self._merge_thread = threading.Thread(target=self._merge_segments, daemon=True)
+            self._merge_thread.start()
+    
+    def _pick_merge(self):
+        # Find the oldest run of merge_factor adjacent segments of the same size
+        # tier, which keeps segment sizes decreasing from oldest to newest
+        tiers = [segment.tier(self.segment_size, self.merge_factor) for segment in self.segments]
+        for start in range(len(self.segments) - self.merge_factor + 1):
+            if len(set(tiers[start:start + self.merge_factor])) == 1:
+                return start
+        return None
+    
+    def _merge_segments(self):
+        while True:
+            with self._merge_lock:
+                start = self._pick_merge()
+                if start is None:
+                    return
+                inputs = self.segments[start:start + self.merge_factor]
+            
+            # Sealed segments are immutable, so the merge itself runs unlocked
+            merged = Segment.merge(inputs, set(self.deleted_docs))
+            
+            with self._merge_lock:
+                # Only merges replace sealed segments, and they run one at a time
+                self.segments = self.segments[:start] + [merged] + self.segments[start + self.merge_factor:]
+    
+    def wait_for_merges(self):
+        """Block until any background segment merge has finished."""
+        thread = self._merge_thread
+        if thread is not None:
+            thread.join()
+        self._merge_segments()
+    
+    def optimize(self):
+        """
+        Seal the mutable segment and merge every segment into one, dropping
+        the postings of deleted documents.
+        """
+        self.wait_for_merges()
+        
+        with self._merge_lock:
+            segments = self.all_segments()
+            self.active_segment = Segment(len(self.doc_ids))
+            if any(segment.doc_count for segment in segments):
+                self.segments = [Segment.merge(segments, self.deleted_docs)]
+            else:
+                self.segments = []
+            self.deleted_docs = set()
+    
+    def analyze(self, text, use_cache=True):
+        """
+        Turn text into index terms, lemmatized or just tokenized as the
+        documents are.
         
-        for token in tokens:
-            self.index[token].add(doc_id)
+        Args:
+            text: The text to analyze, or an already analyzed query (an
+                  AnalyzedQuery), whose terms are returned without running
+                  the tokenizer again
+            use_cache: Whether the tokenizer's analysis cache is used, which
+                       is meant for queries rather than documents
+            
+        Returns:
+            list: The analyzed terms
+        """
+        if not isinstance(text, str):
+            return list(text.terms)
+        if self.use_lemmatization:
+            return self.tokenizer.lemmatize(text, use_cache=use_cache)
+        return self.tokenizer.tokenize(text, use_cache=use_cache)
     
     def lookup(self, term):
         """
         Look up a term in the index.
         
         Args:
-            term: The term to look up
+            term: The term to look up, or an AnalyzedQuery whose first term
+                  is looked up
             
         Returns:
             A set of document IDs that contain the term
         """
-        if self.use_lemmatization:
-            processed_terms = self.tokenizer.lemmatize(term)
-        else:
-            processed_terms = self.tokenizer.tokenize(term)
-            
+        processed_terms = self.analyze(term)
         if not processed_terms:
             return set()
         
-        return self.index.get(processed_terms[0], set())
+        return set(self.resolve(self.get_postings(processed_terms[0])))
+    
+    def get_postings(self, term):
+        """
+        Get the postings list of an already analyzed term.
+        
+        Args:
+            term: The analyzed term
+            
+        Returns:
+            PostingsList: The sorted document numbers containing the term
+        """
+        postings = self.index.get(term)
+        return postings if postings is not None else PostingsList()
+    
+    def get_positions(self, doc_id, term):
+        """
+        Get the token positions of an analyzed term within a document.
+        
+        Args:
+            doc_id: The document ID
+            term: The analyzed term
+            
+        Returns:
+            The sorted positions of the term, empty if it doesn't occur
+        """
+        return self.positions.get(doc_id, {}).get(term, ())
+    
+    def phrase_postings(self, terms):
+        """
+        Find the documents containing the analyzed terms as a consecutive phrase.
+        
+        Documents containing every term are found by intersecting postings,
+        then the phrase is verified by intersecting the terms' positions.
+        
+        Args:
+            terms: The analyzed phrase terms, in order
+            
+        Returns:
+            PostingsList: The document numbers containing the phrase
+        """
+        if not terms:
+            return PostingsList()
+        
+        candidates = intersect_all([self.get_postings(term) for term in terms])
+        if len(terms) == 1:
+            return candidates
+        
+        matches = []
+        for doc_num in candidates:
+            if self.doc_ids[doc_num] is None:
+                continue
+            doc_positions = self.positions[self.doc_ids[doc_num]]
+            
+            # Shift every term's positions back to where the phrase would start
+            starts = set(doc_positions[terms[0]])
+            for offset, term in enumerate(terms[1:], 1):
+                starts.intersection_update(position - offset for position in doc_positions[term])
+                if not starts:
+                    break
+            
+            if starts:
+                matches.append(doc_num)
+        
+        return PostingsList(matches)
+    
+    def near_postings(self, first, second, distance):
+        """
+        Find the documents where two analyzed terms occur within a given
+        number of positions of each other, in either order.
+        
+        Args:
+            first: The first analyzed term
+            second: The second analyzed term
+            distance: The maximum number of positions between the terms
+            
+        Returns:
+            PostingsList: The document numbers satisfying the proximity constraint
+        """
+        candidates = self.get_postings(first).intersect(self.get_postings(second))
+        
+        matches = []
+        for doc_num in candidates:
+            if self.doc_ids[doc_num] is None:
+                continue
+            doc_positions = self.positions[self.doc_ids[doc_num]]
+            if _within_distance(doc_positions[first], doc_positions[second], distance):
+                matches.append(doc_num)
+        
+        return PostingsList(matches)
+    
+    def resolve(self, postings):
+        """
+        Map document numbers from a postings list back to document IDs.
+        
+        Args:
+            postings: An iterable of document numbers
+            
+        Returns:
+            list: The corresponding document IDs
+        """
+        doc_ids = self.doc_ids
+        return [doc_ids[doc_num] for doc_num in postings if doc_ids[doc_num] is not None]
+    
+    def compress_postings(self, terms=None):
+        """
+        Delta + varint compress postings lists, e.g. those of cold terms.
+        Compressed lists are decoded transparently when read.
+        
+        Args:
+            terms: The terms to compress, or None to compress every list
+        """
+        for segment in self.all_segments():
+            for term in (segment.postings if terms is None else terms):
+                if term in segment.postings:
+                    segment.postings[term].compress()
+    
+    def save(self, directory):
+        """
+        Save the index (term dictionary, postings, term statistics and
+        document store) as a segment directory.
+        
+        Args:
+            directory: The directory to write the segment files to
+        """
+        write_segment(self, directory)
+    
+    @classmethod
+    def load(cls, directory, tokenizer=None):
+        """
+        Load an index saved with save(). The segment files are memory-mapped,
+        so loading is near-instant and the OS page cache is shared between
+        processes serving the same index.
+        
+        Args:
+            directory: The segment directory
+            tokenizer: The tokenizer to use for processing text, which should
+                       match the one the index was built with
+            
+        Returns:
+            InvertedIndex: The loaded index
+        """
+        index = cls(tokenizer=tokenizer)
+        read_segment(directory, index)
+        return index
     
     def get_document(self, doc_id):
         """
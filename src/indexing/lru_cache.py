@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A bounded mapping that evicts its least recently used entry when full,
+    and counts hits and misses. Access is guarded by a lock, so one cache can
+    be shared by threads serving queries.
+    """
+
+    def __init__(self, max_size=1024):
+        """
+        Initialize the cache.
+
+        Args:
+            max_size: The maximum number of entries; 0 disables caching
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        Look up an entry and mark it as most recently used.
+
+        Args:
+            key: The entry's key
+
+        Returns:
+            The cached value, or None if the key isn't cached
+        """
+        with self._lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Add or replace an entry, evicting the least recently used one if the
+        cache is full.
+
+        Args:
+            key: The entry's key
+            value: The value to cache, which must not be None
+        """
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry. The hit and miss counters are kept."""
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self):
+        """
+        Get the cache's counters.
+
+        Returns:
+            dict: The size, max_size, hits, misses and hit_rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,285 @@
+import heapq
+from array import array
+from bisect import bisect_left
+
+# Below this size ratio a linear merge beats galloping through the longer list
+GALLOP_RATIO = 8
+
+
+class PostingsList:
+    """
+    A sorted list of dense integer document numbers, stored compactly in an
+    array('I') instead of a set of arbitrary document IDs.
+
+    Lists can optionally be compressed with delta + varint encoding, which is
+    useful for cold terms. A compressed list is decoded on the fly when read
+    and decompressed permanently when it's modified. Lists can also be backed
+    by a read-only buffer, such as a slice of a memory-mapped segment file,
+    which is copied into an array only when the list is modified.
+    """
+
+    __slots__ = ("_docs", "_compressed", "_length")
+
+    def __init__(self, docs=None):
+        """
+        Initialize the postings list.
+
+        Args:
+            docs: An optional iterable of document numbers in ascending order
+        """
+        self._docs = array("I", docs or ())
+        self._compressed = None
+        self._length = len(self._docs)
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """
+        Create a postings list that reads directly from a buffer of sorted
+        unsigned ints without copying it.
+
+        Args:
+            buffer: A memoryview cast to unsigned ints
+
+        Returns:
+            PostingsList: A list backed by the buffer
+        """
+        postings = cls()
+        postings._docs = buffer
+        postings._length = len(buffer)
+        return postings
+
+    def add(self, doc_num):
+        """
+        Add a document number, keeping the list sorted and free of duplicates.
+
+        Args:
+            doc_num: The dense document number
+        """
+        docs = self._materialize()
+
+        # Document numbers are handed out in increasing order, so this is
+        # almost always a plain append
+        if not docs or doc_num > docs[-1]:
+            docs.append(doc_num)
+        else:
+            position = bisect_left(docs, doc_num)
+            if position < len(docs) and docs[position] == doc_num:
+                return
+            docs.insert(position, doc_num)
+
+        self._length = len(docs)
+
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return self._length > 0
+
+    def __iter__(self):
+        if self._compressed is not None:
+            return _decode(self._compressed)
+        return iter(self._docs)
+
+    def __contains__(self, doc_num):
+        docs = self.docs
+        position = bisect_left(docs, doc_num)
+        return position < len(docs) and docs[position] == doc_num
+
+    @property
+    def docs(self):
+        """The document numbers as a sorted array, decoded if compressed."""
+        if self._compressed is not None:
+            return array("I", _decode(self._compressed))
+        return self._docs
+
+    @property
+    def is_compressed(self):
+        return self._compressed is not None
+
+    def compress(self):
+        """Replace the array with its delta + varint encoding."""
+        if self._compressed is None:
+            self._compressed = _encode(self._docs)
+            self._docs = None
+
+    def nbytes(self):
+        """Return the number of bytes used by the stored document numbers."""
+        if self._compressed is not None:
+            return len(self._compressed)
+        return len(self._docs) * self._docs.itemsize
+
+    def _materialize(self):
+        if self._compressed is not None:
+            self._docs = array("I", _decode(self._compressed))
+            self._compressed = None
+        elif not isinstance(self._docs, array):
+            # Copy on write for lists backed by a read-only buffer
+            self._docs = array("I", self._docs)
+        return self._docs
+
+    def intersect(self, other):
+        """
+        Intersect with another postings list.
+
+        Uses galloping (exponential) search of the longer list when the sizes
+        are very different, and a linear merge otherwise.
+
+        Args:
+            other: Another PostingsList
+
+        Returns:
+            PostingsList: The document numbers present in both lists
+        """
+        shorter, longer = sorted((self.docs, other.docs), key=len)
+        if not shorter:
+            return PostingsList()
+
+        if len(longer) >= GALLOP_RATIO * len(shorter):
+            return PostingsList(_gallop_intersect(shorter, longer))
+        return PostingsList(_merge_intersect(shorter, longer))
+
+    def union(self, other):
+        """
+        Merge with another postings list.
+
+        Args:
+            other: Another PostingsList
+
+        Returns:
+            PostingsList: The document numbers present in either list
+        """
+        return union_all([self, other])
+
+    def difference(self, other):
+        """
+        Remove the document numbers of another postings list.
+
+        Args:
+            other: Another PostingsList
+
+        Returns:
+            PostingsList: The document numbers in this list but not in the other
+        """
+        docs = self.docs
+        if not docs or not other:
+            return PostingsList(docs)
+
+        excluded = other.docs
+        result = []
+        position = 0
+        size = len(excluded)
+        for doc_num in docs:
+            position = bisect_left(excluded, doc_num, position, size)
+            if position >= size or excluded[position] != doc_num:
+                result.append(doc_num)
+        return PostingsList(result)
+
+
+def intersect_all(postings_lists):
+    """
+    Intersect several postings lists, starting from the shortest one and
+    stopping as soon as the result is empty.
+
+    Args:
+        postings_lists: A list of PostingsList objects
+
+    Returns:
+        PostingsList: The document numbers present in every list
+    """
+    if not postings_lists:
+        return PostingsList()
+
+    ordered = sorted(postings_lists, key=len)
+    result = ordered[0]
+    for postings in ordered[1:]:
+        if not result:
+            break
+        result = result.intersect(postings)
+    return result
+
+
+def union_all(postings_lists):
+    """
+    Merge several postings lists into one.
+
+    Args:
+        postings_lists: A list of PostingsList objects
+
+    Returns:
+        PostingsList: The document numbers present in any list
+    """
+    merged = array("I")
+    last = -1
+    for doc_num in heapq.merge(*[iter(postings) for postings in postings_lists]):
+        if doc_num != last:
+            merged.append(doc_num)
+            last = doc_num
+    result = PostingsList()
+    result._docs = merged
+    result._length = len(merged)
+    return result
+
+
+def _merge_intersect(first, second):
+    result = []
+    i = j = 0
+    len_first, len_second = len(first), len(second)
+    while i < len_first and j < len_second:
+        a, b = first[i], second[j]
+        if a == b:
+            result.append(a)
+            i += 1
+            j += 1
+        elif a < b:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def _gallop_intersect(shorter, longer):
+    result = []
+    low = 0
+    size = len(longer)
+    for doc_num in shorter:
+        # Exponential search for a window that contains doc_num, then bisect it
+        step = 1
+        high = low
+        while high < size and longer[high] < doc_num:
+            low = high
+            high += step
+            step *= 2
+        low = bisect_left(longer, doc_num, low, min(high + 1, size))
+        if low >= size:
+            break
+        if longer[low] == doc_num:
+            result.append(doc_num)
+    return result
+
+
+def _encode(docs):
+    encoded = bytearray()
+    previous = 0
+    for doc_num in docs:
+        delta = doc_num - previous
+        previous = doc_num
+        while delta >= 0x80:
+            encoded.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        encoded.append(delta)
+    return bytes(encoded)
+
+
+def _decode(encoded):
+    value = 0
+    shift = 0
+    previous = 0
+    for byte in encoded:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            previous += value
+            yield previous
+            value = 0
+            shift = 0
@@ -0,0 +1,155 @@
+import math
+from array import array
+from collections.abc import Mapping
+from .postings import PostingsList
+
+
+class Segment:
+    """
+    The postings of a run of consecutive document numbers.
+
+    New documents go into a small mutable segment. Once it's full it is
+    sealed and never modified again, apart from being merged with its
+    neighbours into a larger sealed segment. Since document numbers only
+    grow, every document in a segment has a higher number than every
+    document in the segments before it, so a term's postings across all
+    segments are simply the concatenation of its per-segment lists.
+    """
+
+    __slots__ = ("base", "doc_count", "postings", "sealed")
+
+    def __init__(self, base, postings=None, doc_count=0, sealed=False):
+        """
+        Initialize the segment.
+
+        Args:
+            base: The first document number the segment can hold
+            postings: An optional dict of term -> PostingsList
+            doc_count: The number of document numbers the segment spans
+            sealed: Whether the segment is immutable
+        """
+        self.base = base
+        self.postings = postings if postings is not None else {}
+        self.doc_count = doc_count
+        self.sealed = sealed
+
+    def add(self, doc_num, terms):
+        """
+        Add a document's distinct terms to a mutable segment.
+
+        Args:
+            doc_num: The document number, which must be the highest so far
+            terms: The document's distinct analyzed terms
+        """
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = PostingsList()
+            postings.add(doc_num)
+        self.doc_count = doc_num - self.base + 1
+
+    def seal(self):
+        self.sealed = True
+
+    def without(self, deleted):
+        """
+        Copy the segment without the postings of deleted documents.
+
+        Args:
+            deleted: A set of deleted document numbers
+
+        Returns:
+            Segment: The compacted segment
+        """
+        postings = {}
+        for term, term_postings in self.postings.items():
+            docs = array("I", [doc_num for doc_num in term_postings if doc_num not in deleted])
+            if docs:
+                postings[term] = PostingsList.from_buffer(docs) if self.sealed else PostingsList(docs)
+        return Segment(self.base, postings, doc_count=self.doc_count, sealed=self.sealed)
+
+    @classmethod
+    def merge(cls, segments, deleted=()):
+        """
+        Merge consecutive sealed segments into one sealed segment, dropping
+        the postings of deleted documents along the way.
+
+        Args:
+            segments: The segments to merge, in document number order
+            deleted: A set of deleted document numbers
+
+        Returns:
+            Segment: The merged segment
+        """
+        merged = {}
+        for segment in segments:
+            for term, postings in segment.postings.items():
+                docs = merged.get(term)
+                if docs is None:
+                    docs = merged[term] = array("I")
+                if deleted:
+                    docs.extend(doc_num for doc_num in postings if doc_num not in deleted)
+                else:
+                    docs.extend(postings.docs)
+
+        last = segments[-1]
+        return cls(
+            segments[0].base,
+            {term: PostingsList.from_buffer(docs) for term, docs in merged.items() if docs},
+            doc_count=last.base + last.doc_count - segments[0].base,
+            sealed=True
+        )
+
+    def tier(self, segment_size, merge_factor):
+        """
+        The size tier of the segment: segments of up to segment_size documents
+        are tier 0, and each following tier is merge_factor times larger.
+        """
+        if self.doc_count <= segment_size:
+            return 0
+        return int(math.log(self.doc_count / segment_size, merge_factor) + 1e-9)
+
+
+class SegmentedPostings(Mapping):
+    """
+    A read-only term -> PostingsList view over all of an index's segments.
+
+    Lookups fan out to every segment and concatenate the per-segment lists;
+    terms found in a single segment are returned without copying.
+    """
+
+    def __init__(self, index):
+        """
+        Initialize the view.
+
+        Args:
+            index: The InvertedIndex whose segments and doc_freqs are used
+        """
+        self._index = index
+
+    def __getitem__(self, term):
+        if term not in self._index.doc_freqs:
+            raise KeyError(term)
+
+        parts = []
+        for segment in self._index.all_segments():
+            postings = segment.postings.get(term)
+            if postings:
+                parts.append(postings)
+
+        if len(parts) == 1:
+            return parts[0]
+
+        docs = array("I")
+        for postings in parts:
+            docs.extend(postings.docs)
+        return PostingsList.from_buffer(docs)
+
+    def __contains__(self, term):
+        return term in self._index.doc_freqs
+
+    def __iter__(self):
+        return iter(list(self._index.doc_freqs))
+
+    def __len__(self):
+        return len(self._index.doc_freqs)
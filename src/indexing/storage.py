@@ -0,0 +1,245 @@
+import json
+import mmap
+import os
+from array import array
+from collections.abc import MutableMapping
+from .postings import PostingsList
+from .segment import Segment
+
+FORMAT_VERSION = 1
+
+# Segment files. Integer arrays are stored in native byte order.
+META_FILE = "meta.json"
+DOC_IDS_FILE = "doc_ids.json"
+TERM_OFFSETS_FILE = "term_offsets.bin"  # uint64, one past the end of each term's postings
+POSTINGS_FILE = "postings.bin"  # uint32 document numbers, term after term
+DOCUMENTS_FILE = "documents.bin"  # UTF-8 document contents, one after the other
+DOC_OFFSETS_FILE = "doc_offsets.bin"  # uint64, one past the end of each document
+DOC_LENGTHS_FILE = "doc_lengths.bin"  # uint32 number of indexed tokens per document
+FORWARD_OFFSETS_FILE = "forward_offsets.bin"  # uint64, one past each document's last forward entry
+FORWARD_TERMS_FILE = "forward_terms.bin"  # uint32 term number of each forward entry
+POSITION_OFFSETS_FILE = "position_offsets.bin"  # uint64, one past each forward entry's positions
+POSITIONS_FILE = "positions.bin"  # uint32 token positions
+
+
+def write_segment(index, directory):
+    """
+    Write an inverted index to a segment directory.
+
+    The term dictionary and document IDs are stored as JSON, everything else
+    as flat integer arrays and UTF-8 text that read_segment memory-maps. Document
+    IDs must therefore be JSON serializable (strings or integers).
+
+    Args:
+        index: The InvertedIndex to write
+        directory: The directory to write the segment files to
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    terms = sorted(index.index)
+    term_numbers = {term: number for number, term in enumerate(terms)}
+
+    # Postings of deleted documents are left out
+    doc_ids = index.doc_ids
+    term_offsets = array("Q", [0])
+    postings = array("I")
+    for term in terms:
+        postings.extend(doc_num for doc_num in index.index[term] if doc_ids[doc_num] is not None)
+        term_offsets.append(len(postings))
+
+    documents = bytearray()
+    doc_offsets = array("Q", [0])
+    doc_lengths = array("I")
+    forward_offsets = array("Q", [0])
+    forward_terms = array("I")
+    position_offsets = array("Q", [0])
+    positions = array("I")
+
+    for doc_id in index.doc_ids:
+        # Superseded document numbers are kept as empty entries
+        if doc_id is not None:
+            documents.extend(index.documents[doc_id].encode("utf-8"))
+            doc_lengths.append(index.doc_lengths[doc_id])
+
+            for term, term_positions in index.positions[doc_id].items():
+                forward_terms.append(term_numbers[term])
+                positions.extend(term_positions)
+                position_offsets.append(len(positions))
+        else:
+            doc_lengths.append(0)
+
+        doc_offsets.append(len(documents))
+        forward_offsets.append(len(forward_terms))
+
+    meta = {
+        "version": FORMAT_VERSION,
+        "use_lemmatization": index.use_lemmatization,
+        "total_length": index.total_length,
+        "terms": [[term, index.doc_freq(term), *index.term_bounds[term]] for term in terms],
+    }
+    with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    with open(os.path.join(directory, DOC_IDS_FILE), "w", encoding="utf-8") as f:
+        json.dump(index.doc_ids, f)
+
+    with open(os.path.join(directory, DOCUMENTS_FILE), "wb") as f:
+        f.write(documents)
+
+    for name, values in (
+        (TERM_OFFSETS_FILE, term_offsets),
+        (POSTINGS_FILE, postings),
+        (DOC_OFFSETS_FILE, doc_offsets),
+        (DOC_LENGTHS_FILE, doc_lengths),
+        (FORWARD_OFFSETS_FILE, forward_offsets),
+        (FORWARD_TERMS_FILE, forward_terms),
+        (POSITION_OFFSETS_FILE, position_offsets),
+        (POSITIONS_FILE, positions),
+    ):
+        with open(os.path.join(directory, name), "wb") as f:
+            values.tofile(f)
+
+
+def read_segment(directory, index):
+    """
+    Load a segment directory written by write_segment into an empty index.
+
+    The segment files are memory-mapped rather than read: postings lists are
+    views into the mapped postings file, and document contents, lengths, term
+    frequencies and positions are decoded lazily per document on access. Pages
+    are loaded by the OS on demand and shared between processes mapping the
+    same files. Documents added afterwards are kept in memory on top of the
+    mapped data.
+
+    Args:
+        directory: The segment directory
+        index: The empty InvertedIndex to populate
+    """
+    with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["version"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported index format version: {meta['version']}")
+
+    with open(os.path.join(directory, DOC_IDS_FILE), encoding="utf-8") as f:
+        doc_ids = json.load(f)
+
+    term_offsets = _map_array(directory, TERM_OFFSETS_FILE, "Q")
+    postings = _map_array(directory, POSTINGS_FILE, "I")
+    documents = _map_file(directory, DOCUMENTS_FILE)
+    doc_offsets = _map_array(directory, DOC_OFFSETS_FILE, "Q")
+    doc_lengths = _map_array(directory, DOC_LENGTHS_FILE, "I")
+    forward_offsets = _map_array(directory, FORWARD_OFFSETS_FILE, "Q")
+    forward_terms = _map_array(directory, FORWARD_TERMS_FILE, "I")
+    position_offsets = _map_array(directory, POSITION_OFFSETS_FILE, "Q")
+    positions = _map_array(directory, POSITIONS_FILE, "I")
+
+    terms = []
+    segment_postings = {}
+    for number, (term, doc_freq, max_freq, min_length) in enumerate(meta["terms"]):
+        terms.append(term)
+        start, end = term_offsets[number], term_offsets[number + 1]
+        segment_postings[term] = PostingsList.from_buffer(postings[start:end])
+        index.doc_freqs[term] = doc_freq
+        index.term_bounds[term] = (max_freq, min_length)
+
+    def decode_content(doc_num):
+        return str(documents[doc_offsets[doc_num]:doc_offsets[doc_num + 1]], "utf-8")
+
+    def decode_positions(doc_num):
+        doc_positions = {}
+        for entry in range(forward_offsets[doc_num], forward_offsets[doc_num + 1]):
+            start, end = position_offsets[entry], position_offsets[entry + 1]
+            doc_positions[terms[forward_terms[entry]]] = positions[start:end]
+        return doc_positions
+
+    def decode_term_freqs(doc_num):
+        return {term: len(term_positions) for term, term_positions in decode_positions(doc_num).items()}
+
+    index.use_lemmatization = meta["use_lemmatization"]
+    index.total_length = meta["total_length"]
+    # The whole file becomes one sealed segment, followed by an empty mutable one
+    index.segments = [Segment(0, segment_postings, doc_count=len(doc_ids), sealed=True)] if doc_ids else []
+    index.active_segment = Segment(len(doc_ids))
+    index.doc_ids = doc_ids
+    index.doc_numbers = {doc_id: doc_num for doc_num, doc_id in enumerate(doc_ids) if doc_id is not None}
+    stored = len(index.doc_numbers)
+    index.documents = SegmentMapping(index, len(doc_ids), stored, decode_content)
+    index.doc_lengths = SegmentMapping(index, len(doc_ids), stored, doc_lengths.__getitem__)
+    index.term_freqs = SegmentMapping(index, len(doc_ids), stored, decode_term_freqs)
+    index.positions = SegmentMapping(index, len(doc_ids), stored, decode_positions)
+
+
+class SegmentMapping(MutableMapping):
+    """
+    A doc_id keyed mapping whose entries for the first `size` document numbers
+    are decoded on access from memory-mapped segment files. Writes and deletes
+    are recorded in memory on top of the mapped entries.
+    """
+
+    def __init__(self, index, size, stored, decode):
+        """
+        Initialize the mapping.
+
+        Args:
+            index: The index whose doc_ids / doc_numbers map keys to numbers
+            size: The number of document numbers the segment spans
+            stored: The number of those that hold a document
+            decode: A function returning the value for a document number
+        """
+        self._index = index
+        self._size = size
+        self._stored = stored
+        self._decode = decode
+        self._changes = {}
+        self._hidden = set()  # Mapped keys that were overwritten or deleted
+
+    def _mapped_number(self, key):
+        doc_num = self._index.doc_numbers.get(key)
+        if doc_num is None or doc_num >= self._size or key in self._hidden:
+            return None
+        return doc_num
+
+    def __getitem__(self, key):
+        if key in self._changes:
+            return self._changes[key]
+        doc_num = self._mapped_number(key)
+        if doc_num is None:
+            raise KeyError(key)
+        return self._decode(doc_num)
+
+    def __contains__(self, key):
+        return key in self._changes or self._mapped_number(key) is not None
+
+    def __setitem__(self, key, value):
+        if self._mapped_number(key) is not None:
+            self._hidden.add(key)
+        self._changes[key] = value
+
+    def __delitem__(self, key):
+        if key in self._changes:
+            del self._changes[key]
+        elif self._mapped_number(key) is not None:
+            self._hidden.add(key)
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        doc_ids = self._index.doc_ids
+        for doc_num in range(self._size):
+            doc_id = doc_ids[doc_num]
+            if self._mapped_number(doc_id) == doc_num and doc_id not in self._changes:
+                yield doc_id
+        yield from self._changes
+
+    def __len__(self):
+        return self._stored - len(self._hidden) + len(self._changes)
+
+
+def _map_file(directory, name):
+    with open(os.path.join(directory, name), "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return memoryview(b"")
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def _map_array(directory, name, typecode):
+    return _map_file(directory, name).cast(typecode)
@@ -1,60 +1,268 @@
+from itertools import islice
 import spacy
+from .lru_cache import LRUCache
+
+# Pipelines: "full" runs every component of the language model, "fast" skips
+# the ones that don't feed lemma_, is_stop or is_punct, and "lookup" replaces
+# the statistical components with a lookup-table lemmatizer
+PIPELINES = ("full", "fast", "lookup")
+
+# Components not needed for lemmas; en_core_web_sm lemmatizes by rules that
+# only need the tagger and attribute ruler
+UNUSED_COMPONENTS = ["parser", "ner", "senter"]
+
+STATISTICAL_COMPONENTS = ["tok2vec", "tagger", "morphologizer", "parser", "senter",
+                          "attribute_ruler", "lemmatizer", "ner"]
+
+
+def iter_batches(iterable, batch_size):
+    """
+    Split an iterable into lists of at most batch_size items.
+    
+    Args:
+        iterable: The items to split
+        batch_size: The maximum number of items per batch
+        
+    Yields:
+        list: The next batch of items
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
 
 class Tokenizer:
     """
     Handles text tokenization and preprocessing using spaCy.
+    
+    The results of analyzing short strings, such as queries, are kept in an
+    LRU cache, so repeated queries skip the spaCy pipeline. tokenize() and
+    lemmatize() use it by default and pipe() on request; document ingestion
+    leaves it out, so documents don't evict queries. Replacing nlp or
+    changing remove_stopwords clears the cache.
+    
+    Tokenizing never needs more than spaCy's rule-based tokenizer, since
+    stopword and punctuation flags are lexical, so only lemmatizing runs the
+    pipeline. With memoize_lemmas, the lemma of every surface form the
+    pipeline has seen is remembered, and a text whose forms are all known is
+    lemmatized from the table without running the pipeline. Lemmas then no
+    longer depend on context: a form keeps the lemma it was first seen with.
     """
     
-    def __init__(self, remove_stopwords=True, language_model="en_core_web_sm"):
+    def __init__(self, remove_stopwords=True, language_model="en_core_web_sm",
+                 cache_size=1024, cache_max_length=128, pipeline="full",
+                 memoize_lemmas=False):
         """
         Initialize the tokenizer.
         
         Args:
             remove_stopwords (bool): Whether to remove stopwords
             language_model (str): The spaCy language model to use
+            cache_size (int): The number of analyzed strings to cache; 0
+                              disables the cache
+            cache_max_length (int): The length in characters of the longest
+                                    string that is cached
+            pipeline (str): "full", "fast" (without the parser and NER, same
+                            lemmas) or "lookup" (a lookup-table lemmatizer
+                            instead of the tagger, which needs the
+                            spacy-lookups-data package)
+            memoize_lemmas (bool): Whether to lemmatize known surface forms
+                                   from a table built up while processing text
         """
+        if pipeline not in PIPELINES:
+            raise ValueError(f"Unknown tokenizer pipeline: {pipeline}")
+        
+        self.cache = LRUCache(cache_size)
+        self.cache_max_length = cache_max_length
+        self.pipeline = pipeline
+        self.memoize_lemmas = memoize_lemmas
+        self.lemma_memo = {}  # surface form -> lemma
         self.remove_stopwords = remove_stopwords
-        self.nlp = spacy.load(language_model)
+        self.nlp = self._load(language_model, pipeline)
+    
+    def _load(self, language_model, pipeline):
+        if pipeline == "full":
+            return spacy.load(language_model)
+        if pipeline == "fast":
+            return spacy.load(language_model, exclude=UNUSED_COMPONENTS)
+        
+        try:
+            import spacy_lookups_data  # noqa: F401
+        except ImportError:
+            raise ImportError("The lookup pipeline needs the spacy-lookups-data package "
+                              "(pip install spacy-lookups-data)") from None
         
-        # For better performance when we just need tokenization
-        if not remove_stopwords:
-            # Create a pipeline with only tokenization
-            self.nlp = spacy.load(language_model, disable=["tagger", "parser", "ner", "lemmatizer"])
+        nlp = spacy.load(language_model, exclude=STATISTICAL_COMPONENTS)
+        nlp.add_pipe("lemmatizer", config={"mode": "lookup"}).initialize()
+        return nlp
+    
+    @property
+    def nlp(self):
+        """The spaCy pipeline; assigning a new one clears the analysis cache and lemma table."""
+        return self._nlp
+    
+    @nlp.setter
+    def nlp(self, nlp):
+        self._nlp = nlp
+        self.cache.clear()
+        self.lemma_memo = {}
+    
+    @property
+    def remove_stopwords(self):
+        """Whether stopwords are removed; changing it clears the analysis cache."""
+        return self._remove_stopwords
+    
+    @remove_stopwords.setter
+    def remove_stopwords(self, remove_stopwords):
+        self._remove_stopwords = remove_stopwords
+        self.cache.clear()
     
-    def tokenize(self, text):
+    def tokenize(self, text, use_cache=True):
         """
         Tokenize and preprocess text.
         
         Args:
             text (str): The text to tokenize
+            use_cache (bool): Whether to look up and store short texts in
+                              the analysis cache
             
         Returns:
             list: A list of preprocessed tokens
         """
-        doc = self.nlp(text.lower())
-        
-        if self.remove_stopwords:
-            tokens = [token.text for token in doc if not token.is_stop and not token.is_punct and token.text.strip()]
-        else:
-            tokens = [token.text for token in doc if not token.is_punct and token.text.strip()]
-            
-        return tokens
+        return self._analyze(text, lemmatize=False, use_cache=use_cache)
     
-    def lemmatize(self, text):
+    def lemmatize(self, text, use_cache=True):
         """
         Tokenize and lemmatize text.
         
         Args:
             text (str): The text to process
+            use_cache (bool): Whether to look up and store short texts in
+                              the analysis cache
             
         Returns:
             list: A list of lemmatized tokens
         """
-        doc = self.nlp(text.lower())
+        return self._analyze(text, lemmatize=True, use_cache=use_cache)
+    
+    def _analyze(self, text, lemmatize, use_cache):
+        if not use_cache or len(text) > self.cache_max_length:
+            return self._process(text, lemmatize)
         
-        if self.remove_stopwords:
-            lemmas = [token.lemma_ for token in doc if not token.is_stop and not token.is_punct and token.text.strip()]
+        tokens = self._cached(text, lemmatize)
+        if tokens is None:
+            tokens = self._process(text, lemmatize)
+            self.cache.put((text, lemmatize), tuple(tokens))
+        return tokens
+    
+    def _cached(self, text, lemmatize):
+        tokens = self.cache.get((text, lemmatize))
+        # A fresh list, so callers can't modify the cached tokens
+        return list(tokens) if tokens is not None else None
+    
+    def _process(self, text, lemmatize):
+        doc = self.nlp.make_doc(text.lower())
+        if not lemmatize:
+            return self._extract(doc, lemmatize=False)
+        if self._memoized(doc):
+            return self._extract_memoized(doc)
+        return self._extract(self.nlp(doc), lemmatize=True)
+    
+    def pipe(self, texts, lemmatize=True, batch_size=1000, n_process=1, as_tuples=False,
+             use_cache=False):
+        """
+        Process a stream of texts in batches through spaCy's nlp.pipe.
+        
+        Without lemmatize, only spaCy's tokenizer runs. With memoize_lemmas,
+        texts whose surface forms are all in the lemma table skip the
+        pipeline, and the rest of each batch goes through nlp.pipe together,
+        so n_process applies per batch. With use_cache, short texts are
+        looked up in the analysis cache first, in the same per-batch way.
+        
+        Args:
+            texts: An iterable of strings, or of (text, context) pairs when
+                   as_tuples is True
+            lemmatize (bool): Whether to return lemmas instead of tokens
+            batch_size (int): Number of texts spaCy processes per batch
+            n_process (int): Number of worker processes spaCy should use
+            as_tuples (bool): Whether the input carries a context object per text
+            use_cache (bool): Whether to look up and store short texts in the
+                              analysis cache, for queries rather than documents
+            
+        Yields:
+            list: The processed tokens for each text in input order, or
+                  (tokens, context) pairs when as_tuples is True
+        """
+        if not as_tuples:
+            texts = ((text, None) for text in texts)
+        
+        if use_cache:
+            results = self._pipe_cached(texts, lemmatize, batch_size, n_process)
+        elif not lemmatize:
+            pairs = ((text.lower(), context) for text, context in texts)
+            results = ((self._extract(self.nlp.make_doc(text), lemmatize=False), context)
+                       for text, context in pairs)
+        elif self.memoize_lemmas:
+            results = self._pipe_memoized(texts, batch_size, n_process)
         else:
-            lemmas = [token.lemma_ for token in doc if not token.is_punct and token.text.strip()]
+            lowered = ((text.lower(), context) for text, context in texts)
+            docs = self.nlp.pipe(lowered, as_tuples=True, batch_size=batch_size, n_process=n_process)
+            results = ((self._extract(doc, lemmatize=True), context) for doc, context in docs)
+        
+        for tokens, context in results:
+            yield (tokens, context) if as_tuples else tokens
+    
+    def _pipe_cached(self, texts, lemmatize, batch_size, n_process):
+        for batch in iter_batches(texts, batch_size):
+            tokens = [self._cached(text, lemmatize) if len(text) <= self.cache_max_length else None
+                      for text, _ in batch]
+            
+            missing = [i for i, text_tokens in enumerate(tokens) if text_tokens is None]
+            analyzed = self.pipe((batch[i] for i in missing), lemmatize=lemmatize, batch_size=batch_size,
+                                 n_process=n_process, as_tuples=True)
+            for i, (text_tokens, _) in zip(missing, analyzed):
+                tokens[i] = text_tokens
+                text = batch[i][0]
+                if len(text) <= self.cache_max_length:
+                    self.cache.put((text, lemmatize), tuple(text_tokens))
+            
+            for text_tokens, (_, context) in zip(tokens, batch):
+                yield text_tokens, context
+    
+    def _pipe_memoized(self, texts, batch_size, n_process):
+        for batch in iter_batches(texts, batch_size):
+            docs = [self.nlp.make_doc(text.lower()) for text, _ in batch]
+            tokens = [self._extract_memoized(doc) if self._memoized(doc) else None for doc in docs]
+            
+            unknown = [i for i, doc_tokens in enumerate(tokens) if doc_tokens is None]
+            processed = self.nlp.pipe((docs[i] for i in unknown), batch_size=batch_size, n_process=n_process)
+            for i, doc in zip(unknown, processed):
+                tokens[i] = self._extract(doc, lemmatize=True)
             
-        return lemmas
\ No newline at end of file
+            for doc_tokens, (_, context) in zip(tokens, batch):
+                yield doc_tokens, context
+    
+    def _memoized(self, doc):
+        return self.memoize_lemmas and all(token.text in self.lemma_memo for token in self._kept(doc))
+    
+    def _extract_memoized(self, doc):
+        return [self.lemma_memo[token.text] for token in self._kept(doc)]
+    
+    def _kept(self, doc):
+        if self.remove_stopwords:
+            return [token for token in doc if not token.is_stop and not token.is_punct and token.text.strip()]
+        return [token for token in doc if not token.is_punct and token.text.strip()]
+    
+    def _extract(self, doc, lemmatize):
+        tokens = self._kept(doc)
+        
+        if lemmatize:
+            lemmas = [token.lemma_ for token in tokens]
+            if self.memoize_lemmas:
+                for token, lemma in zip(tokens, lemmas):
+                    self.lemma_memo.setdefault(token.text, lemma)
+            return lemmas
+        return [token.text for token in tokens]
\ No newline at end of file
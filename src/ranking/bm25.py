@@ -0,0 +1,195 @@
+import heapq
+import math
+from collections import Counter
+
+class BM25Ranker:
+    """
+    Implements Okapi BM25 ranking with MaxScore-style dynamic pruning for
+    top-k retrieval.
+
+    Like the TF-IDF ranker, all statistics are read from the live index at
+    query time. For pruning, the index keeps per-term bounds (the highest
+    frequency of the term in any document and the shortest document that
+    contains it), from which an upper bound on the term's score contribution
+    is derived.
+    """
+
+    def __init__(self, index, k1=1.2, b=0.75):
+        """
+        Initialize the BM25 ranker.
+
+        Args:
+            index: The inverted index to use for document retrieval
+            k1: Term frequency saturation parameter
+            b: Document length normalization parameter
+        """
+        self.index = index
+        self.k1 = k1
+        self.b = b
+
+    def idf(self, term):
+        """
+        Calculate the BM25 inverse document frequency of a term.
+
+        Args:
+            term: An already analyzed term
+
+        Returns:
+            float: The IDF value, or 0.0 if the term is not in the index
+        """
+        doc_freq = self.index.doc_freq(term)
+        if doc_freq == 0:
+            return 0.0
+
+        N = len(self.index.documents)
+        return math.log(1.0 + (N - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def upper_bound(self, term):
+        """
+        Calculate the highest score the term can contribute to any document.
+
+        The BM25 term score grows with the term frequency and shrinks with the
+        document length, so combining the term's maximum frequency with the
+        shortest document containing it gives a safe upper bound.
+
+        Args:
+            term: An already analyzed term
+
+        Returns:
+            float: The upper bound on the term's score contribution
+        """
+        if term not in self.index.term_bounds:
+            return 0.0
+
+        max_freq, min_length = self.index.term_bounds[term]
+        return self._term_score(max_freq, min_length, self.idf(term), self._average_length())
+
+    def score(self, query, doc_id):
+        """
+        Calculate the BM25 score for a query-document pair.
+
+        Args:
+            query: The search query, or an AnalyzedQuery to score without
+                   analyzing it again
+            doc_id: The document ID
+
+        Returns:
+            float: The BM25 score
+        """
+        query_terms = self.index.analyze(query)
+
+        return self.rank(query_terms, [doc_id]).get(doc_id, 0.0)
+
+    def rank(self, query_terms, doc_ids):
+        """
+        Calculate BM25 scores for a set of candidate documents.
+
+        Args:
+            query_terms: The already analyzed query terms
+            doc_ids: The candidate document IDs
+
+        Returns:
+            dict: A mapping of doc_id -> BM25 score
+        """
+        average_length = self._average_length()
+        weights = [(term, self.idf(term)) for term in query_terms]
+
+        scores = {}
+        for doc_id in doc_ids:
+            doc_terms = self.index.term_freqs.get(doc_id)
+            if doc_terms is None:
+                continue
+
+            length = self.index.doc_lengths[doc_id]
+            score = 0.0
+            for term, idf in weights:
+                if term in doc_terms:
+                    score += self._term_score(doc_terms[term], length, idf, average_length)
+            scores[doc_id] = score
+
+        return scores
+
+    def top_k(self, query_terms, k, candidates=None):
+        """
+        Retrieve the k best scoring documents term-at-a-time with MaxScore
+        pruning.
+
+        Terms are processed from the highest to the lowest upper bound. Once
+        the k-th best score so far reaches the sum of the upper bounds of the
+        terms still to process, no unseen document can make it into the top k,
+        so the remaining terms only update the documents already being scored
+        instead of walking their (typically long) postings. Documents that can
+        no longer reach the top k are dropped along the way.
+
+        Args:
+            query_terms: The already analyzed query terms
+            k: The number of results to return
+            candidates: Optional set of document IDs to restrict scoring to
+
+        Returns:
+            list: Up to k (doc_id, score) tuples sorted by descending score
+        """
+        if k <= 0:
+            return []
+
+        average_length = self._average_length()
+        term_freqs = self.index.term_freqs
+        doc_lengths = self.index.doc_lengths
+
+        plan = []
+        for term, query_freq in Counter(query_terms).items():
+            postings = self.index.index.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            bound = query_freq * self.upper_bound(term)
+            plan.append((bound, term, query_freq, idf, postings))
+
+        plan.sort(key=lambda entry: entry[0], reverse=True)
+        remaining = sum(entry[0] for entry in plan)
+
+        scores = {}
+        threshold = 0.0
+
+        for bound, term, query_freq, idf, postings in plan:
+            if len(scores) >= k and threshold >= remaining:
+                # No unseen document can enter the top k: only update
+                # documents already being scored
+                docs = list(scores)
+            elif candidates is not None and len(candidates) < len(postings):
+                docs = candidates
+            else:
+                docs = self.index.resolve(postings)
+
+            for doc_id in docs:
+                if candidates is not None and doc_id not in candidates:
+                    continue
+                freq = term_freqs[doc_id].get(term)
+                if freq is None:
+                    continue
+                contribution = query_freq * self._term_score(freq, doc_lengths[doc_id], idf, average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + contribution
+
+            # Clamped, since rounding can leave it just below zero after the
+            # last term, which would prune documents tied with the k-th score
+            remaining = max(0.0, remaining - bound)
+
+            if len(scores) >= k:
+                threshold = heapq.nlargest(k, scores.values())[-1]
+                # Drop documents that cannot catch up with the current top k
+                scores = {doc_id: score for doc_id, score in scores.items()
+                          if score + remaining >= threshold}
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def _average_length(self):
+        if not self.index.documents:
+            return 0.0
+        return self.index.total_length / len(self.index.documents)
+
+    def _term_score(self, freq, length, idf, average_length):
+        if average_length > 0:
+            norm = 1.0 - self.b + self.b * length / average_length
+        else:
+            norm = 1.0
+        return idf * freq * (self.k1 + 1.0) / (freq + self.k1 * norm)
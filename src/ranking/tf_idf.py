@@ -1,11 +1,17 @@
+import heapq
 import math
-from collections import defaultdict, Counter
 
 class TFIDFRanker:
     """
     Implements TF-IDF (Term Frequency-Inverse Document Frequency) ranking.
+
+    The ranker keeps no statistics of its own. Term frequencies, document
+    frequencies, the document count and document lengths are maintained
+    incrementally by the index as documents are added, and IDF is computed
+    from those live counters at query time, so the ranker never goes stale
+    and never needs rebuilding.
     """
-    
+
     def __init__(self, index):
         """
         Initialize the TF-IDF ranker.
@@ -14,83 +20,101 @@ class TFIDFRanker:
             index : The inverted index to use for document retrieval.
         """
         self.index = index
-        self.tf = {} # doc_id -> term -> frequency
-        self.idf = {} # term -> inverse document frequency
-        self.doc_lengths = {} # doc_id -> length of the document
-        
-        self._build_tf_idf()
-        
-    def _build_tf_idf(self):
+
+    def idf(self, term):
         """
-        Calculate TF and IDF values for all terms and documents
+        Calculate the inverse document frequency of a term from the live index.
+
+        Args:
+            term: An already analyzed term
+
+        Returns:
+            float: The IDF value, or 0.0 if the term is not in the index
         """
-        
-        # Total number of documents
-        N = len(self.index.documents)
-        
-        if N == 0:
-            return
-        
-        # Calculate term frequency (TF) and document frequency (DF)
-        df = defaultdict(int) # term -> document frequency
-        
-        for doc_id, content in self.index.documents.items():
-            if self.index.use_lemmatization:
-                tokens = self.index.tokenizer.lemmatize(content)
-            else:
-                tokens = self.index.tokenizer.tokenize(content)
-           
-            term_counts = Counter(tokens)
-            self.tf[doc_id] = term_counts
-            
-            self.tf[doc_id] = {}
-            for term, count in term_counts.items():
-                # Calculate term frequency (TF)
-                self.tf[doc_id][term] = count
-                
-                df[term] += 1
-                
-        # Calculate inverse document frequency (IDF)
-        for term, doc_freq in df.items():
-            # IDF = log(N / doc_freq)
-            self.idf[term] = math.log(N / (doc_freq))
-            
+        doc_freq = self.index.doc_freq(term)
+        if doc_freq == 0:
+            return 0.0
+
+        # IDF = log(N / doc_freq)
+        return math.log(len(self.index.documents) / doc_freq)
+
     # TF gives us information on how often a term appears in a document and IDF gives us information about the relative rarity of a term in the collection of documents. By multiplying these values together we can get our final TF-IDF value.
-    
+
     # The higher the TF-IDF score the more important or relevant the term is; as a term gets less relevant, its TF-IDF score will approach 0.
     def score(self, query, doc_id):
         """
         Calculate the TF-IDF score for a query-document pair.
-        
+
         Args:
-            query: The search query
+            query: The search query, or an AnalyzedQuery to score without
+                   analyzing it again
             doc_id: The document ID
-            
+
         Returns:
             float: The TF-IDF score
         """
         # Process the query
-        if self.index.use_lemmatization:
-            query_terms = self.index.tokenizer.lemmatize(query)
-        else:
-            query_terms = self.index.tokenizer.tokenize(query)
-        
-        # No query terms or document not in index
-        if not query_terms or doc_id not in self.tf:
-            return 0.0
-        
-        score = 0.0
-        
-        # Calculate score for each query term
-        for term in query_terms:
-            if term in self.idf and term in self.tf.get(doc_id, {}):
+        query_terms = self.index.analyze(query)
+
+        return self.rank(query_terms, [doc_id]).get(doc_id, 0.0)
+
+    def rank(self, query_terms, doc_ids):
+        """
+        Calculate TF-IDF scores for a set of candidate documents.
+
+        The IDF of each query term is computed once, and the work done is
+        proportional to the number of (term, candidate) pairs touched rather
+        than to the size of the corpus.
+
+        Args:
+            query_terms: The already analyzed query terms
+            doc_ids: The candidate document IDs
+
+        Returns:
+            dict: A mapping of doc_id -> TF-IDF score
+        """
+        term_freqs = self.index.term_freqs
+        doc_lengths = self.index.doc_lengths
+
+        idfs = [(term, self.idf(term)) for term in query_terms]
+
+        scores = {}
+        for doc_id in doc_ids:
+            # Document not in index
+            doc_terms = term_freqs.get(doc_id)
+            if doc_terms is None:
+                continue
+
+            score = 0.0
+            for term, idf in idfs:
                 # TF-IDF score = TF * IDF
-                tf = self.tf[doc_id][term]
-                idf = self.idf[term]
-                score += tf * idf
-        
-        # Normalize by document length to avoid bias towards longer documents
-        if doc_id in self.doc_lengths and self.doc_lengths[doc_id] > 0:
-            score /= self.doc_lengths[doc_id]
-        
-        return score
+                score += doc_terms.get(term, 0) * idf
+
+            # Normalize by document length to avoid bias towards longer documents
+            if doc_lengths.get(doc_id, 0) > 0:
+                score /= doc_lengths[doc_id]
+
+            scores[doc_id] = score
+
+        return scores
+
+    def top_k(self, query_terms, k, candidates=None):
+        """
+        Retrieve the k best scoring documents.
+
+        Args:
+            query_terms: The already analyzed query terms
+            k: The number of results to return
+            candidates: Optional set of document IDs to restrict scoring to,
+                        otherwise every document containing a query term
+
+        Returns:
+            list: Up to k (doc_id, score) tuples sorted by descending score
+        """
+        if candidates is None:
+            candidates = set()
+            for term in query_terms:
+                candidates.update(self.index.resolve(self.index.get_postings(term)))
+
+        scores = self.rank(query_terms, candidates)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
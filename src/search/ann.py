@@ -0,0 +1,203 @@
+from array import array
+import numpy as np
+
+
+def normalize_rows(vectors):
+    """
+    Scale vectors to unit L2 length, so dot products are cosine similarities.
+
+    Args:
+        vectors: A 2-D array of row vectors
+
+    Returns:
+        numpy.ndarray: The normalized float32 rows; all-zero rows stay zero
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class IVFIndex:
+    """
+    An inverted file (IVF) index for approximate cosine nearest neighbour
+    search.
+
+    Vectors are clustered with spherical k-means and every vector is filed
+    under its closest centroid. A query is only compared against the vectors
+    filed under its n_probe closest centroids, so it scores roughly
+    n_probe / n_lists of the collection instead of all of it. Raising n_probe
+    trades latency for recall.
+
+    The index only stores row numbers; the vectors themselves stay in the
+    caller's matrix of L2-normalized rows and are passed to search(). New
+    rows are filed under the existing centroids, so centroids only need
+    retraining once the collection has grown well past the sample they were
+    trained on.
+    """
+
+    def __init__(self, n_lists=None, n_probe=8, iterations=10, sample_size=256, seed=0):
+        """
+        Initialize the index.
+
+        Args:
+            n_lists: The number of clusters, defaults to about sqrt(N) at training
+            n_probe: The default number of clusters searched per query
+            iterations: The number of k-means iterations
+            sample_size: The number of training vectors sampled per cluster
+            seed: The random seed for sampling and centroid initialization
+        """
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.iterations = iterations
+        self.sample_size = sample_size
+        self.seed = seed
+        self.centroids = None
+        self.lists = []
+        self.trained_size = 0
+        self.size = 0
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def train(self, vectors):
+        """
+        Compute the centroids with spherical k-means on a sample of vectors.
+        Any rows already added are dropped.
+
+        Args:
+            vectors: A 2-D array of row vectors, or any sequence of rows that
+                     supports len() and indexing with an array of row numbers
+        """
+        count = len(vectors)
+        if count == 0:
+            raise ValueError("Cannot train an IVF index without vectors")
+
+        n_lists = self.n_lists or max(1, int(np.sqrt(count)))
+        n_lists = min(n_lists, count)
+        rng = np.random.default_rng(self.seed)
+
+        sample_count = min(count, n_lists * self.sample_size)
+        sample = np.sort(rng.choice(count, sample_count, replace=False))
+        sample = normalize_rows(vectors[sample])
+
+        centroids = sample[rng.choice(sample_count, n_lists, replace=False)]
+        for _ in range(self.iterations):
+            assignment = self._nearest(centroids, sample)
+            counts = np.bincount(assignment, minlength=n_lists)
+
+            # Sum each cluster's vectors as one contiguous run of the sorted sample
+            order = np.argsort(assignment, kind="stable")
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            filled = np.flatnonzero(counts)
+            sums = np.zeros_like(centroids)
+            sums[filled] = np.add.reduceat(sample[order], starts[filled], axis=0)
+
+            # Re-seed clusters that lost all their vectors
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                sums[empty] = sample[rng.choice(sample_count, len(empty), replace=False)]
+            centroids = normalize_rows(sums)
+
+        self.centroids = centroids
+        self.lists = [array("q") for _ in range(n_lists)]
+        self.trained_size = count
+        self.size = 0
+
+    def add(self, rows, vectors):
+        """
+        File vectors under their closest centroids.
+
+        Args:
+            rows: The row numbers of the vectors in the caller's matrix
+            vectors: The vectors, one per row number
+        """
+        if not self.is_trained:
+            raise ValueError("The IVF index must be trained before adding vectors")
+        if len(rows) == 0:
+            return
+
+        assignment = self._nearest(self.centroids, normalize_rows(vectors))
+        for row, list_number in zip(rows, assignment.tolist()):
+            self.lists[list_number].append(row)
+        self.size += len(rows)
+
+    def search(self, matrix, query, k, n_probe=None):
+        """
+        Find the approximate k nearest rows of a query by cosine similarity.
+
+        Args:
+            matrix: The caller's matrix of L2-normalized rows, which the added
+                    row numbers refer to
+            query: The query vector
+            k: The number of rows to return
+            n_probe: The number of clusters to search, defaults to self.n_probe
+
+        Returns:
+            tuple: Arrays of row numbers and their similarities, best first
+        """
+        return self.score(matrix, query, self.candidates(query, n_probe), k)
+
+    def candidates(self, query, n_probe=None):
+        """
+        Collect the row numbers filed under the clusters closest to a query.
+
+        The result is a copy, so it can be scored with score() while rows
+        are added to the index.
+
+        Args:
+            query: The query vector
+            n_probe: The number of clusters to search, defaults to self.n_probe
+
+        Returns:
+            numpy.ndarray: The candidate row numbers
+        """
+        query = normalize_rows(np.asarray(query).reshape(1, -1))[0]
+        n_probe = min(n_probe or self.n_probe, len(self.lists))
+
+        centroid_scores = self.centroids @ query
+        if n_probe < len(self.lists):
+            probes = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        else:
+            probes = np.arange(len(self.lists))
+
+        candidates = [np.frombuffer(self.lists[list_number], dtype=np.int64)
+                      for list_number in probes if len(self.lists[list_number])]
+        if not candidates:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(candidates)
+
+    @staticmethod
+    def score(matrix, query, candidates, k):
+        """
+        Rank candidate rows by cosine similarity to a query.
+
+        Args:
+            matrix: The caller's matrix of L2-normalized rows
+            query: The query vector
+            candidates: The row numbers to score, as returned by candidates()
+            k: The number of rows to return
+
+        Returns:
+            tuple: Arrays of row numbers and their similarities, best first
+        """
+        if not len(candidates):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = normalize_rows(np.asarray(query).reshape(1, -1))[0]
+        scores = matrix[candidates] @ query
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return candidates[top], scores[top]
+
+    def _nearest(self, centroids, vectors, chunk_size=4096):
+        # Chunked to bound the size of the score matrix
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            scores = vectors[start:start + chunk_size] @ centroids.T
+            assignment[start:start + chunk_size] = scores.argmax(axis=1)
+        return assignment
@@ -1,65 +1,85 @@
 from ..indexing.inverted_index import InvertedIndex
 from ..ranking.tf_idf import TFIDFRanker
+from ..ranking.bm25 import BM25Ranker
+from .query_parser import QueryParser, QueryPlanner, Term, Or
 
 class BasicSearch:
     """
     Provides basic keyword search functionality using an inverted index.
     """
     
-    def __init__(self, index=None):
+    def __init__(self, index=None, ranking="tfidf"):
         """
         Initialize the search engine.
         
         Args:
             index: An existing inverted index, or None to create a new one
+            ranking (str): The ranking function - "tfidf" or "bm25"
         """
         self.index = index or InvertedIndex()
-        self.ranker = None
+        
+        if ranking == "tfidf":
+            self.ranker = TFIDFRanker(self.index)
+        elif ranking == "bm25":
+            self.ranker = BM25Ranker(self.index)
+        else:
+            raise ValueError(f"Unknown ranking function: {ranking}")
+        
+        self.parser = QueryParser(self.index)
+        self.planner = QueryPlanner(self.index)
     
-    def search(self, query, mode="AND", rank=True):
+    def search(self, query, mode="AND", rank=True, limit=None):
         """
         Search for documents matching the query.
         
+        The query may use AND, OR and NOT (upper case) with parentheses for
+        grouping, quoted phrases such as "machine learning", which match the
+        terms as consecutive tokens, and proximity clauses such as
+        `data NEAR/3 science`, which match when the two terms occur within 3
+        token positions of each other. Terms without an explicit operator
+        between them are combined according to the search mode.
+        
         Args:
-            query (str): The search query
+            query: The search query, or an AnalyzedQuery from the parser's
+                   analyze(), which skips analyzing the words again
             mode (str): The search mode - "AND" requires all terms to match,
                         "OR" requires any term to match
             rank (bool): Whether to rank results by relevance
+            limit (int): The maximum number of results to return, or None for
+                         all matches. With ranking enabled, only the best
+                         `limit` documents are retrieved from the ranker.
         
         Returns:
             list: A list of (doc_id, document, score) tuples for matching documents
         """
-        if self.index.use_lemmatization:
-            tokens = self.index.tokenizer.lemmatize(query)
-        else:
-            tokens = self.index.tokenizer.tokenize(query)
+        node = self.parser.parse(query, default_operator=mode)
+        tokens = self.planner.positive_terms(node)
         
         if not tokens:
             return []
         
-        result_docs = self.index.lookup(tokens[0])
+        if rank and limit is not None and self._is_disjunction(node):
+            # Let the ranker pull the best documents straight from the postings
+            top_docs = self.ranker.top_k(tokens, limit)
+            return [(doc_id, self.index.get_document(doc_id), score) for doc_id, score in top_docs]
         
-        for token in tokens[1:]:
-            docs = self.index.lookup(token)
-            if mode == "AND":
-                result_docs = result_docs.intersection(docs)
-            else:  # "OR" mode
-                result_docs = result_docs.union(docs)
-            
-            if mode == "AND" and not result_docs:
-                break
+        # Conjunctions run cheapest clause first and stop once empty
+        result_docs = self.index.resolve(self.planner.evaluate(node))
+        
+        if rank and limit is not None:
+            top_docs = self.ranker.top_k(tokens, limit, candidates=set(result_docs))
+            return [(doc_id, self.index.get_document(doc_id), score) for doc_id, score in top_docs]
+        
+        if rank:
+            # Score all candidates at once against the live index statistics
+            scores = self.ranker.rank(tokens, result_docs)
         
         results = []
         for doc_id in result_docs:
             document = self.index.get_document(doc_id)
             
             if rank:
-                if self.ranker is None:
-                    self.ranker = TFIDFRanker(self.index)
-                
-                # Get the document's score
-                score = self.ranker.score(query, doc_id)
-                results.append((doc_id, document, score))
+                results.append((doc_id, document, scores.get(doc_id, 0.0)))
             else:
                 results.append((doc_id, document, 1.0))
         
@@ -67,4 +87,12 @@ class BasicSearch:
         if rank:
             results.sort(key=lambda x: x[2], reverse=True)
         
-        return results
\ No newline at end of file
+        if limit is not None:
+            results = results[:limit]
+        
+        return results
+    
+    def _is_disjunction(self, node):
+        if isinstance(node, Term):
+            return True
+        return isinstance(node, Or) and all(isinstance(child, Term) for child in node.children)
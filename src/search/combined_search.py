@@ -1,46 +1,238 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from ..indexing.inverted_index import InvertedIndex
 from ..search.basic_search import BasicSearch
 from ..search.fuzzy_search import FuzzySearch
 from ..search.phonetic_search import PhoneticSearch
 from ..search.semantic_search import SemanticSearch
 
+ENGINES = ("basic", "fuzzy", "phonetic", "semantic")
+
+# Scores of each engine are scaled by its weight before results are merged
+ENGINE_WEIGHTS = {"basic": 1.0, "fuzzy": 0.8, "phonetic": 0.8, "semantic": 0.9}
+
+# Threads each engine's pool runs queries on
+ENGINE_WORKERS = 4
+
 class CombinedSearch:
 
-    def __init__(self, index=None):
+    def __init__(self, index=None, build=True, embedding_cache=None, deferred_encoding=False,
+                 deadlines=None, engine_workers=ENGINE_WORKERS):
+        """
+        Initialize the combined search.
+        
+        Args:
+            index: The inverted index shared by every engine
+            build: Whether to build the engines' structures from the index right away
+            embedding_cache: An optional EmbeddingCache for the semantic engine
+            deferred_encoding: Whether the semantic engine queues new documents
+                               and encodes them in batches
+            deadlines: Optional engine name -> seconds a query waits for that
+                       engine; engines without one are always waited for
+            engine_workers: The number of threads each engine runs queries on
+        """
         self.index = index or InvertedIndex()
+        self.deadlines = dict(deadlines or {})
+        self._deadlines()  # Reject unknown engine names early
+        
+        # A bounded pool per engine, so a slow engine only queues its own
+        # work and can't take threads from the others
+        self.executors = {
+            engine: ThreadPoolExecutor(max_workers=engine_workers, thread_name_prefix=f"search-{engine}")
+            for engine in ENGINES
+        }
         
         self.basic_search = BasicSearch(index=self.index)
         self.fuzzy_search = FuzzySearch(index=self.index)
-        self.phonetic_search = PhoneticSearch(index=self.index)
-        self.semantic_search = SemanticSearch(index=self.index)
+        self.phonetic_search = PhoneticSearch(index=self.index, build=build)
+        self.semantic_search = SemanticSearch(
+            index=self.index,
+            build=build,
+            embedding_cache=embedding_cache,
+            deferred=deferred_encoding
+        )
+    
+    def save(self, directory):
+        """
+        Save the index segment, phonetic maps, BK-tree and embeddings so the
+        engine can be restored with load() without re-analyzing the corpus.
+        
+        Args:
+            directory: The directory to write to
+        """
+        self.index.save(os.path.join(directory, 'index'))
+        self.phonetic_search.save(os.path.join(directory, 'phonetic.json'))
+        self.fuzzy_search.save_bktree(os.path.join(directory, 'bktree.npz'))
+        self.semantic_search.save(os.path.join(directory, 'semantic'))
+    
+    @classmethod
+    def load(cls, directory, tokenizer=None, embedding_cache=None):
+        """
+        Restore an engine saved with save(). The index segment and embeddings
+        are memory-mapped, so startup does no spaCy or SentenceTransformer work.
+        
+        Args:
+            directory: The directory written by save()
+            tokenizer: The tokenizer to use for queries and new documents
+            embedding_cache: An optional EmbeddingCache for new documents
+            
+        Returns:
+            CombinedSearch: The restored engine
+        """
+        index = InvertedIndex.load(os.path.join(directory, 'index'), tokenizer=tokenizer)
+        search = cls(index=index, build=False, embedding_cache=embedding_cache)
+        search.phonetic_search.load(os.path.join(directory, 'phonetic.json'))
+        search.fuzzy_search.load_bktree(os.path.join(directory, 'bktree.npz'))
+        search.semantic_search.load(os.path.join(directory, 'semantic'))
+        return search
+    
+    def close(self, wait=True):
+        """
+        Shut down the engines' thread pools. Queries waiting for a thread are
+        cancelled.
+        
+        Args:
+            wait: Whether to wait for the queries already running to finish
+        """
+        for executor in self.executors.values():
+            executor.shutdown(wait=wait, cancel_futures=True)
     
     def add_document(self, doc_id, content):
+        if doc_id in self.index.doc_numbers:
+            self.delete_document(doc_id)
+        
         self.semantic_search.add_document(doc_id, content)
+        self.fuzzy_search.add_terms(self.index.term_freqs[doc_id])
+        self.phonetic_search.add_document(doc_id)
+    
+    def add_documents(self, documents, batch_size=1000, n_process=1):
+        batches = self.index.index_batches(documents, batch_size=batch_size, n_process=n_process,
+                                           with_replaced=True)
+        for batch, replaced in batches:
+            self.semantic_search.add_embeddings(batch)
+            self.fuzzy_search.add_terms({term for doc_id, _ in batch for term in self.index.term_freqs[doc_id]})
+            # Terms of replaced versions, including earlier copies of a
+            # doc_id within this batch, that left the vocabulary
+            for doc_id, terms in replaced.items():
+                self.phonetic_search.remove_document(doc_id, terms)
+                self.fuzzy_search.remove_terms(terms)
+            for doc_id in {doc_id for doc_id, _ in batch}:
+                self.phonetic_search.add_document(doc_id)
+    
+    def delete_document(self, doc_id):
+        """
+        Delete a document from every engine. The document is tombstoned in the
+        index and embeddings matrix until compact() reclaims the space.
         
-        self.phonetic_search._build_phonetic_indices()
+        Args:
+            doc_id: The document ID
+            
+        Returns:
+            bool: Whether the document was in the index
+        """
+        if doc_id not in self.index.doc_numbers:
+            return False
+        
+        terms = list(self.index.term_freqs[doc_id])
+        self.semantic_search.delete_document(doc_id)
+        self.phonetic_search.remove_document(doc_id, terms)
+        self.fuzzy_search.remove_terms(terms)
+        return True
+    
+    def update_document(self, doc_id, content):
+        """
+        Replace a document's content in every engine.
+        
+        Args:
+            doc_id: The document ID
+            content: The document's new text content
+        """
+        self.add_document(doc_id, content)
+    
+    def compact(self):
+        """
+        Reclaim the space of deleted documents: postings in the index, rows in
+        the embeddings matrix and nodes in the BK-tree, without a full rebuild.
+        """
+        self.index.compact()
+        self.semantic_search.compact()
+        self.fuzzy_search.compact_bktree()
     
-    def search(self, query, mode="combined", limit=10):
+    def search(self, query, mode="combined", limit=10, deadlines=None):
+        """
+        Search with one engine, or with all of them in parallel and merge
+        the results.
+        
+        Args:
+            query: The search query
+            mode: "combined", or one of "basic", "fuzzy", "phonetic" and
+                  "semantic"
+            limit: The maximum number of results
+            deadlines: Optional engine name -> seconds overrides of the
+                       engines' deadlines for this query
+            
+        Returns:
+            list: (doc_id, content, score, technique) tuples sorted by
+                  descending score, without the results of engines that
+                  missed their deadline
+        """
+        results, _ = self.search_with_timeouts(query, mode=mode, limit=limit, deadlines=deadlines)
+        return results
+    
+    def search_with_timeouts(self, query, mode="combined", limit=10, deadlines=None):
+        """
+        Like search(), but also report which engines missed their deadline.
+        
+        The engines run concurrently, each on its own bounded thread pool, so
+        a combined query takes as long as its slowest engine rather than the
+        sum of all four, and a slow engine only holds up queries to itself.
+        Each engine's deadline counts from the start of the query, including
+        time spent waiting for one of the engine's threads, so a saturated
+        engine times out instead of piling up work; its queued work is
+        cancelled. The results of engines that finish in time are merged and
+        the others are reported. A running engine can't be interrupted, so
+        it keeps its thread until it finishes and its results are discarded.
+        
+        Args:
+            query: The search query
+            mode: "combined", or one of "basic", "fuzzy", "phonetic" and
+                  "semantic"
+            limit: The maximum number of results
+            deadlines: Optional engine name -> seconds overrides of the
+                       engines' deadlines for this query
+            
+        Returns:
+            tuple: The merged results as returned by search(), and the list
+                   of engines that timed out
+        """
+        deadlines = self._deadlines(deadlines)
+        engines = ENGINES if mode == "combined" else [engine for engine in ENGINES if engine == mode]
+        
+        if mode != "semantic":
+            # Analyze the query once and share it with every engine and ranker
+            query = self.basic_search.parser.analyze(query)
+        
         results = []
+        timed_out = []
+        start_time = time.time()
+        futures = {engine: self.executors[engine].submit(self._search_engine, engine, query, limit)
+                   for engine in engines}
+        
+        for engine in engines:
+            deadline = deadlines.get(engine)
+            timeout = None if deadline is None else max(0.0, start_time + deadline - time.time())
+            try:
+                engine_results = futures[engine].result(timeout=timeout)
+            except FutureTimeoutError:
+                # Drop the work if it is still waiting for a thread
+                futures[engine].cancel()
+                timed_out.append(engine)
+                continue
+            
+            for doc_id, content, score in engine_results:
+                results.append((doc_id, content, score * ENGINE_WEIGHTS[engine], engine))
         
-        if mode == "basic" or mode == "combined":
-            basic_results = self.basic_search.search(query, rank=True)
-            for doc_id, content, score in basic_results:
-                results.append((doc_id, content, score, "basic"))
-        
-        if mode == "fuzzy" or mode == "combined":
-            fuzzy_results = self.fuzzy_search.search(query, limit=limit)
-            for doc_id, content, score in fuzzy_results:
-                results.append((doc_id, content, score * 0.8, "fuzzy")) 
-        
-        if mode == "phonetic" or mode == "combined":
-            phonetic_results = self.phonetic_search.search(query, limit=limit)
-            for doc_id, content, score in phonetic_results:
-                results.append((doc_id, content, score * 0.8, "phonetic")) 
-        
-        if mode == "semantic" or mode == "combined":
-            semantic_results = self.semantic_search.search(query, top_k=limit)
-            for doc_id, content, score in semantic_results:
-                results.append((doc_id, content, score * 0.9, "semantic")) 
         unique_results = {}
         for doc_id, content, score, technique in results:
             if doc_id not in unique_results or score > unique_results[doc_id][1]:
@@ -50,4 +242,21 @@ class CombinedSearch:
                          for doc_id, (content, score, technique) in unique_results.items()]
         final_results.sort(key=lambda x: x[2], reverse=True)
         
-        return final_results[:limit]
\ No newline at end of file
+        return final_results[:limit], timed_out
+    
+    def _search_engine(self, engine, query, limit):
+        if engine == "basic":
+            return self.basic_search.search(query, rank=True, limit=limit)
+        if engine == "fuzzy":
+            return self.fuzzy_search.search(query, limit=limit)
+        if engine == "phonetic":
+            return self.phonetic_search.search(query, limit=limit)
+        return self.semantic_search.search(query, top_k=limit)
+    
+    def _deadlines(self, overrides=None):
+        deadlines = dict(self.deadlines)
+        deadlines.update(overrides or {})
+        for engine in deadlines:
+            if engine not in ENGINES:
+                raise ValueError(f"Unknown search engine: {engine}")
+        return deadlines
@@ -0,0 +1,137 @@
+import numpy as np
+
+
+def bounded_levenshtein(s1, s2, max_distance=None):
+    """
+    Compute the Levenshtein distance between two strings, giving up as soon
+    as it is known to exceed max_distance.
+
+    Uses Myers' bit-vector algorithm: one column of the DP table is packed
+    into the bits of a Python integer and updated with a handful of integer
+    operations per character of the longer string, instead of one min() per
+    table cell. The bottom cell of the column only changes by one per step,
+    so the final distance is at least the current bottom cell minus the
+    number of characters left, and the loop stops once that lower bound
+    exceeds max_distance.
+
+    Args:
+        s1: The first string
+        s2: The second string
+        max_distance: The largest distance of interest, or None for no bound
+
+    Returns:
+        int: The distance, or max_distance + 1 if it is larger than max_distance
+    """
+    if s1 == s2:
+        return 0
+
+    # The shorter string is the bit pattern, the longer one is scanned
+    if len(s1) > len(s2):
+        s1, s2 = s2, s1
+    m, n = len(s1), len(s2)
+
+    if max_distance is None:
+        max_distance = n
+    if n - m > max_distance:
+        return max_distance + 1
+    if m == 0:
+        return n
+
+    peq = {}
+    for i, char in enumerate(s1):
+        peq[char] = peq.get(char, 0) | (1 << i)
+
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv = mask
+    mv = 0
+    score = m
+
+    for j, char in enumerate(s2):
+        eq = peq.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+
+        if score - (n - j - 1) > max_distance:
+            return max_distance + 1
+
+        ph = (ph << 1) | 1
+        mh <<= 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+
+    return score if score <= max_distance else max_distance + 1
+
+
+def batch_levenshtein(word, terms, max_distance):
+    """
+    Compute the bounded Levenshtein distance between one word and many terms
+    at once with NumPy.
+
+    The terms are packed into a matrix of code points, one term per row, and
+    the DP table is filled one row (query character) at a time for all terms
+    together. Within a row, the left-to-right insertion dependency is resolved
+    with a cumulative minimum instead of a Python loop. Terms whose row
+    minimum exceeds max_distance are dropped from further rows.
+
+    Args:
+        word: The query word
+        terms: A sequence of terms
+        max_distance: The largest distance of interest
+
+    Returns:
+        numpy.ndarray: The distance of each term, or max_distance + 1 where it
+                       is larger than max_distance
+    """
+    count = len(terms)
+    distances = np.full(count, max_distance + 1, dtype=np.int32)
+    if count == 0:
+        return distances
+
+    lengths = np.fromiter((len(term) for term in terms), dtype=np.int32, count=count)
+    candidates = np.flatnonzero(np.abs(lengths - len(word)) <= max_distance)
+    if len(candidates) == 0:
+        return distances
+
+    width = int(lengths[candidates].max())
+    if width == 0:
+        distances[candidates] = len(word)
+        return np.minimum(distances, max_distance + 1)
+
+    # Fixed-width unicode strings are stored as UCS-4, so this is a cheap view
+    codes = np.array([terms[i] for i in candidates], dtype=f"U{width}").view(np.uint32)
+    codes = codes.reshape(len(candidates), width)
+    lengths = lengths[candidates]
+
+    offsets = np.arange(width + 1, dtype=np.int32)
+    row = np.tile(offsets, (len(candidates), 1))
+
+    for i, char in enumerate(word, 1):
+        cost = (codes != ord(char)).astype(np.int32)
+        current = np.empty_like(row)
+        current[:, 0] = i
+        np.minimum(row[:, 1:] + 1, row[:, :-1] + cost, out=current[:, 1:])
+        # current[j] = min over k <= j of (current[k] + j - k)
+        current = np.minimum.accumulate(current - offsets, axis=1) + offsets
+
+        # Only the columns within a term's length affect its distance
+        active = current.min(axis=1, where=offsets <= lengths[:, None], initial=width + len(word)) <= max_distance
+        if not active.all():
+            candidates = candidates[active]
+            codes = codes[active]
+            lengths = lengths[active]
+            current = current[active]
+            if len(candidates) == 0:
+                return distances
+        row = current
+
+    final = row[np.arange(len(candidates)), lengths]
+    distances[candidates] = np.minimum(final, max_distance + 1)
+    return distances
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import numpy as np
+
+INDEX_FILE = "index.tsv"  # One "model<TAB>content hash<TAB>shard<TAB>row" line per embedding
+
+
+class EmbeddingCache:
+    """
+    A content-addressed on-disk cache of document embeddings.
+
+    Embeddings are keyed by (model name, SHA-256 of the content), so a
+    document whose text hasn't changed is never encoded twice by the same
+    model, across restarts and re-ingests. They are stored in immutable
+    float32 .npy shards that are memory-mapped on read, and an append-only
+    index file maps keys to (shard, row). New embeddings are kept in memory
+    until flush() writes them out as a new shard.
+    """
+
+    def __init__(self, directory, shard_size=10000):
+        """
+        Open or create a cache.
+
+        Args:
+            directory: The directory holding the shards and index file
+            shard_size: The number of pending embeddings that triggers a flush
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_size = shard_size
+
+        self.entries = {}  # (model name, content hash) -> (shard, row)
+        self.shards = []  # Memory-mapped shard arrays, loaded on first access
+        self.pending = {}  # (model name, content hash) -> embedding
+        self.hits = 0
+        self.misses = 0
+
+        index_path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, encoding="utf-8") as f:
+                for line in f:
+                    model_name, content_hash, shard, row = line.rstrip("\n").split("\t")
+                    self.entries[(model_name, content_hash)] = (int(shard), int(row))
+
+        shard_count = 1 + max((shard for shard, _ in self.entries.values()), default=-1)
+        self.shards = [None] * shard_count
+
+    def __len__(self):
+        return len(self.entries) + len(self.pending)
+
+    def get_many(self, model_name, contents):
+        """
+        Look up the embeddings of several documents.
+
+        Args:
+            model_name: The name of the model the embeddings were computed with
+            contents: The document texts
+
+        Returns:
+            list: The cached embedding of each document, or None where missing
+        """
+        results = []
+        for content in contents:
+            key = (model_name, content_hash(content))
+            embedding = self.pending.get(key)
+            if embedding is None and key in self.entries:
+                shard, row = self.entries[key]
+                embedding = self._shard(shard)[row]
+
+            if embedding is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            results.append(embedding)
+        return results
+
+    def put_many(self, model_name, contents, embeddings):
+        """
+        Add the embeddings of several documents, flushing them to a new shard
+        once shard_size embeddings are pending.
+
+        Args:
+            model_name: The name of the model the embeddings were computed with
+            contents: The document texts
+            embeddings: The embeddings, one row per document
+        """
+        for content, embedding in zip(contents, embeddings):
+            key = (model_name, content_hash(content))
+            if key not in self.entries:
+                self.pending[key] = np.asarray(embedding, dtype=np.float32)
+
+        if len(self.pending) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        """Write the pending embeddings to a new shard and record them in the index file."""
+        if not self.pending:
+            return
+
+        shard = len(self.shards)
+        keys = list(self.pending)
+        matrix = np.stack([self.pending[key] for key in keys])
+
+        # The shard is complete on disk before the index file refers to it
+        shard_path = self._shard_path(shard)
+        with open(shard_path + ".tmp", "wb") as f:
+            np.save(f, matrix)
+        os.replace(shard_path + ".tmp", shard_path)
+
+        with open(os.path.join(self.directory, INDEX_FILE), "a", encoding="utf-8") as f:
+            for row, (model_name, content_hash) in enumerate(keys):
+                f.write(f"{model_name}\t{content_hash}\t{shard}\t{row}\n")
+                self.entries[(model_name, content_hash)] = (shard, row)
+
+        self.shards.append(None)
+        self.pending = {}
+
+    def _shard(self, shard):
+        if self.shards[shard] is None:
+            self.shards[shard] = np.load(self._shard_path(shard), mmap_mode="r")
+        return self.shards[shard]
+
+    def _shard_path(self, shard):
+        return os.path.join(self.directory, f"shard_{shard:05d}.npy")
+
+
+def content_hash(content):
+    """Return the hex SHA-256 digest of a document's UTF-8 content."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
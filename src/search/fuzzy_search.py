@@ -1,28 +1,76 @@
+import threading
 import time
+import numpy as np
 from ..indexing.inverted_index import InvertedIndex
+from .edit_distance import bounded_levenshtein, batch_levenshtein
+from .symspell import DeletionIndex
+from .term_trie import TermTrie
+
+BACKENDS = ("bktree", "trie", "symspell", "linear")
 
 class BKTreeNode:
+    __slots__ = ("term", "children")
+
     def __init__(self, term):
         self.term = term
         self.children = {} 
 
 class FuzzySearch:
-    def __init__(self, index=None, max_distance=2):
+    def __init__(self, index=None, max_distance=2, backend="bktree", prefix_length=7):
+        """
+        Initialize the fuzzy search.
+        
+        Args:
+            index: The inverted index to search
+            max_distance: The maximum edit distance of a fuzzy match
+            backend: How matching terms are found: "bktree", "trie" (a
+                     Levenshtein walk over a term trie), "symspell" (a
+                     deletion index) or "linear"
+            prefix_length: The number of leading characters of each term the
+                           symspell backend indexes deletions of. Longer
+                           prefixes use more memory but verify fewer candidates
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown fuzzy backend: {backend}")
+        if backend == "symspell" and prefix_length <= max_distance:
+            # Checked here rather than when the deletion index is built at
+            # the first query
+            raise ValueError("prefix_length must be larger than max_distance")
+        
         self.index = index if index else InvertedIndex()
         self.max_distance = max_distance
-        self.timing_stats = {'linear': [], 'bktree': []}
+        self.backend = backend
+        self.prefix_length = prefix_length
+        self.timing_stats = {'linear': [], 'bktree': [], 'trie': [], 'symspell': []}
         self.bktree = None 
+        self.bktree_terms = set()
+        self.trie = None
+        self.deletion_index = None
+        # Guards building and updating the structures. Queries only take it
+        # to build a missing structure; they match without it, copying each
+        # dict or set they iterate in a single step, so concurrent updates
+        # are either seen or not but never break a walk
+        self._lock = threading.RLock()
         
     def search(self, query, limit=10):
-        if self.index.use_lemmatization:
-            query_tokens = self.index.tokenizer.lemmatize(query)
-        else:
-            query_tokens = self.index.tokenizer.tokenize(query)   
-            
+        """
+        Search for documents containing terms within max_distance edits of
+        the query terms.
+        
+        Args:
+            query: The search query, or an AnalyzedQuery
+            limit: The maximum number of results
+        
+        Returns:
+            list: (doc_id, content, score) tuples sorted by descending score
+        """
+        query_tokens = self.index.analyze(query)
         if not query_tokens:
             return []
         
-        all_terms = set(self.index.index.keys())
+        # Only the linear scan needs the vocabulary; copying it would make
+        # every query O(V) whatever the backend
+        all_terms = list(self.index.index.keys()) if self.backend == "linear" else None
         
         matches = {}
         
@@ -30,7 +78,7 @@ class FuzzySearch:
             fuzzy_matches = self._get_fuzzy_matches(query_token, all_terms)
             
             for term, distance in fuzzy_matches:
-                docs = self.index.index.get(term, set())
+                docs = self.index.resolve(self.index.get_postings(term))
                 
                 fuzzy_score = 1.0/(distance + 1.0)
 
@@ -49,63 +97,93 @@ class FuzzySearch:
     
     def _get_fuzzy_matches_linear(self, token, all_terms):
         """Linear search implementation for comparison"""
-        matches = []
-        for term in all_terms:
-            distance = self._levenshtein_distance(token, term)
-            if distance <= self.max_distance:
-                matches.append((term, distance))
+        terms = list(all_terms)
+        distances = batch_levenshtein(token, terms, self.max_distance)
+        matches = [(terms[i], int(distances[i])) for i in np.flatnonzero(distances <= self.max_distance)]
         matches.sort(key=lambda x: x[1])
         return matches
 
     def _get_fuzzy_matches(self, token, all_terms):
-        # Build tree if not already built
-        if self.bktree is None:
-            self.build_bktree()
+        if self.backend == "trie":
+            return self._get_fuzzy_matches_trie(token)
+        if self.backend == "symspell":
+            return self._get_fuzzy_matches_symspell(token)
+        if self.backend == "linear":
+            start_time = time.time()
+            matches = self._get_fuzzy_matches_linear(token, all_terms)
+            self.timing_stats['linear'].append(time.time() - start_time)
+            return matches
+        
+        # Build tree if not already built; compaction swaps in a new root, so
+        # the walk stays on the tree it started on
+        bktree = self.bktree
+        if bktree is None:
+            with self._lock:
+                if self.bktree is None:
+                    self.build_bktree()
+                bktree = self.bktree
 
         start_time = time.time()
         linear_time = time.time() - start_time
         self.timing_stats['linear'].append(linear_time)
 
         start_time = time.time()
-        matches = self.search_bk_tree(self.bktree, token, self.max_distance)
+        matches = self.search_bk_tree(bktree, token, self.max_distance)
         matches.sort(key=lambda x: x[1])
         bktree_time = time.time() - start_time
         self.timing_stats['bktree'].append(bktree_time)
 
         return matches
 
+    def _get_fuzzy_matches_trie(self, token):
+        """Levenshtein walk over the term trie, pruning on each row's minimum"""
+        trie = self.trie
+        if trie is None:
+            with self._lock:
+                if self.trie is None:
+                    self.build_trie()
+                trie = self.trie
+        
+        start_time = time.time()
+        matches = trie.search(token, self.max_distance)
+        matches.sort(key=lambda x: x[1])
+        self.timing_stats['trie'].append(time.time() - start_time)
+        
+        return matches
+
+    def _get_fuzzy_matches_symspell(self, token):
+        """Probe the deletion index with the token's deletion variants"""
+        deletion_index = self.deletion_index
+        if deletion_index is None:
+            with self._lock:
+                if self.deletion_index is None:
+                    self.build_deletion_index()
+                deletion_index = self.deletion_index
+        
+        start_time = time.time()
+        matches = deletion_index.lookup(token, self.max_distance)
+        matches.sort(key=lambda x: x[1])
+        self.timing_stats['symspell'].append(time.time() - start_time)
+        
+        return matches
+
     def get_average_times(self):
-        """Get average execution times for both methods"""
+        """Get average execution times for each method"""
         linear_avg = sum(self.timing_stats['linear']) / len(self.timing_stats['linear']) if self.timing_stats['linear'] else 0
         bktree_avg = sum(self.timing_stats['bktree']) / len(self.timing_stats['bktree']) if self.timing_stats['bktree'] else 0
+        trie_avg = sum(self.timing_stats['trie']) / len(self.timing_stats['trie']) if self.timing_stats['trie'] else 0
+        symspell_avg = sum(self.timing_stats['symspell']) / len(self.timing_stats['symspell']) if self.timing_stats['symspell'] else 0
         
         return {
             'linear_search_avg': linear_avg,
             'bktree_search_avg': bktree_avg,
+            'trie_search_avg': trie_avg,
+            'symspell_search_avg': symspell_avg,
             'speedup': linear_avg / bktree_avg if bktree_avg > 0 else 0
         }
     
-    def _levenshtein_distance(self, s1, s2):
-        m = len(s1)
-        n = len(s2)
-        
-        dp = [[0 for _ in range(n + 1)] for _ in range(m + 1)]
-        
-        for i in range(m + 1):
-            dp[i][0] = i
-        for j in range(n + 1):
-            dp[0][j] = j
-            
-        for i in range(1, m + 1):
-            for j in range(1, n+1):
-                cost = 0 if s1[i-1] == s2[j-1] else 1
-                dp[i][j] = min(
-                    dp[i-1][j] + 1,      # deletion
-                    dp[i][j-1] + 1,      # insertion
-                    dp[i-1][j-1] + cost  # substitution
-                )
-        
-        return dp[m][n]
+    def _levenshtein_distance(self, s1, s2, max_distance=None):
+        return bounded_levenshtein(s1, s2, max_distance)
     
     def bk_tree(self, term, all_terms):
         # build the bk tree
@@ -118,46 +196,233 @@ class FuzzySearch:
         return root
 
     def _insert_term(self, node, term):
-        distance = self._levenshtein_distance(node.term, term)
-        
-        if distance == 0:
-            return  # Term already exists in the tree
+        while True:
+            distance = self._levenshtein_distance(node.term, term)
             
-        if distance not in node.children:
-            node.children[distance] = BKTreeNode(term)
-        else:
-            self._insert_term(node.children[distance], term)
+            if distance == 0:
+                return False  # Term already exists in the tree
+            
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = BKTreeNode(term)
+                return True
+            node = child
 
     def search_bk_tree(self, node, query_term, max_distance):
         """
         Search for terms in the BK-tree within the given maximum distance.
         
         Args:
-            node: The current node in the tree
+            node: The node to start from, usually the root
             query_term: The term to search for
             max_distance: The maximum edit distance allowed
             
         Returns:
             List of tuples containing (term, distance) pairs
         """
-        distance = self._levenshtein_distance(node.term, query_term)
         results = []
+        stack = [node] if node is not None else []
+        while stack:
+            node = stack.pop()
+            
+            # Children are only visited within max_distance of the node's distance,
+            # so the distance is only needed up to the largest child edge + max_distance.
+            # The edges are copied in one step, since add_terms() may add children
+            children = node.children.copy()
+            bound = max(children, default=0) + max_distance
+            distance = self._levenshtein_distance(node.term, query_term, bound)
+            
+            if distance <= max_distance:
+                results.append((node.term, distance))
+            
+            # Search child nodes that could contain matches
+            for d in range(distance - max_distance, distance + max_distance + 1):
+                child = children.get(d)
+                if child is not None:
+                    stack.append(child)
         
-        if distance <= max_distance:
-            results.append((node.term, distance))
+        return results
+
+    def add_terms(self, terms):
+        """
+        Add new index terms to the structures that have already been built,
+        so documents indexed after the first query can be matched.
         
-        # Search child nodes that could contain matches
-        for d in range(distance - max_distance, distance + max_distance + 1):
-            if d in node.children:
-                results.extend(self.search_bk_tree(node.children[d], query_term, max_distance))
+        Args:
+            terms: The terms of newly indexed documents
+        """
+        with self._lock:
+            self._add_terms(terms)
+
+    def _add_terms(self, terms):
+        for term in terms:
+            if self.bktree is not None and term not in self.bktree_terms:
+                self.bktree_terms.add(term)
+                self._insert_term(self.bktree, term)
+            if self.trie is not None:
+                self.trie.insert(term)
+            if self.deletion_index is not None:
+                self.deletion_index.add(term)
+
+    def remove_terms(self, terms):
+        """
+        Drop terms that no longer occur in the index from the trie and the
+        deletion index. The BK-tree can't remove a node in place, so its dead
+        terms are reclaimed by compact_bktree().
         
-        return results
+        Args:
+            terms: The terms of deleted or replaced documents; those still in
+                   the index are kept
+        """
+        with self._lock:
+            for term in terms:
+                if term in self.index.doc_freqs:
+                    continue
+                if self.trie is not None:
+                    self.trie.remove(term)
+                if self.deletion_index is not None:
+                    self.deletion_index.remove(term)
+
+    def compact_bktree(self):
+        """
+        Remove the nodes of terms that are no longer in the index. Only the
+        live terms below a removed node are re-inserted, under the removed
+        node's parent, which keeps the BK-tree invariant for every ancestor.
+        """
+        with self._lock:
+            self._compact_bktree()
 
+    def _compact_bktree(self):
+        if self.bktree is None:
+            return
+        
+        live_terms = self.index.doc_freqs
+        if self.bktree.term not in live_terms:
+            self.build_bktree()
+            return
+        
+        # Compact a copy and swap it in, so queries walking the tree without
+        # the lock never see a subtree that is being re-inserted
+        root = self._copy_bktree(self.bktree)
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for distance, child in list(node.children.items()):
+                if child.term in live_terms:
+                    stack.append(child)
+                    continue
+                
+                del node.children[distance]
+                
+                orphans = []
+                subtree = [child]
+                while subtree:
+                    removed = subtree.pop()
+                    if removed.term in live_terms:
+                        orphans.append(removed.term)
+                    else:
+                        self.bktree_terms.discard(removed.term)
+                    subtree.extend(removed.children.values())
+                
+                for term in orphans:
+                    self._insert_term(node, term)
+        
+        self.bktree = root
+    
+    def _copy_bktree(self, root):
+        copy = BKTreeNode(root.term)
+        stack = [(root, copy)]
+        while stack:
+            node, node_copy = stack.pop()
+            for distance, child in node.children.items():
+                child_copy = node_copy.children[distance] = BKTreeNode(child.term)
+                stack.append((child, child_copy))
+        return copy
+    
+    def save_bktree(self, path):
+        """
+        Save the BK-tree in a compact array form: the UTF-8 terms back to back
+        with their end offsets, and for every node the position of its parent
+        and the distance on the edge to it. Nodes are stored parents first, so
+        load_bktree() rebuilds the tree in one pass without computing a single
+        edit distance.
+        
+        Args:
+            path: The file to write
+        """
+        with self._lock:
+            if self.bktree is None:
+                self.build_bktree()
+            
+            terms = bytearray()
+            term_offsets = [0]
+            parents = []
+            distances = []
+            
+            stack = [(self.bktree, -1, 0)] if self.bktree else []
+            while stack:
+                node, parent, distance = stack.pop()
+                position = len(parents)
+                terms.extend(node.term.encode('utf-8'))
+                term_offsets.append(len(terms))
+                parents.append(parent)
+                distances.append(distance)
+                for child_distance, child in node.children.items():
+                    stack.append((child, position, child_distance))
+            
+            with open(path, 'wb') as f:
+                np.savez(
+                    f,
+                    terms=np.frombuffer(bytes(terms), dtype=np.uint8),
+                    term_offsets=np.array(term_offsets, dtype=np.uint64),
+                    parents=np.array(parents, dtype=np.int32),
+                    distances=np.array(distances, dtype=np.uint16)
+                )
+    
+    def load_bktree(self, path):
+        """
+        Load a BK-tree saved by save_bktree() instead of building it.
+        
+        Args:
+            path: The file to read
+        """
+        with self._lock:
+            with np.load(path) as data:
+                terms = data['terms'].tobytes()
+                term_offsets = data['term_offsets'].tolist()
+                parents = data['parents'].tolist()
+                distances = data['distances'].tolist()
+            
+            built = []
+            for position, (parent, distance) in enumerate(zip(parents, distances)):
+                node = BKTreeNode(terms[term_offsets[position]:term_offsets[position + 1]].decode('utf-8'))
+                built.append(node)
+                if parent >= 0:
+                    built[parent].children[distance] = node
+            
+            self.bktree = built[0] if built else None
+            self.bktree_terms = {node.term for node in built}
+    
+    def build_trie(self):
+        """Build the term trie once for all terms in the index"""
+        self.trie = TermTrie(self.index.index.keys())
+    
+    def build_deletion_index(self):
+        """Build the deletion index once for all terms in the index"""
+        self.deletion_index = DeletionIndex(
+            self.index.index.keys(),
+            max_distance=self.max_distance,
+            prefix_length=self.prefix_length
+        )
+    
     def build_bktree(self):
         """Build the BK-tree once for all terms in the index"""
         all_terms = set(self.index.index.keys())
+        self.bktree_terms = all_terms
         if all_terms:
             first_term = next(iter(all_terms))
             self.bktree = self.bk_tree(first_term, all_terms.copy())
+        else:
+            self.bktree = None
 
 
@@ -1,77 +1,226 @@
+import json
 import phonetics
 from collections import defaultdict
 from ..indexing.inverted_index import InvertedIndex
+from ..indexing.lru_cache import LRUCache
+
+ALGORITHMS = ("metaphone", "soundex", "double_metaphone")
 
 class PhoneticSearch:
-   
-    
-    def __init__(self, index=None, algorithm="metaphone"):
+    """
+    Matches query terms to index terms that sound alike.
+
+    Every term is encoded with all supported algorithms in one pass, and each
+    algorithm gets its own code -> terms map, so the algorithm can be chosen
+    per query without rebuilding anything. Double Metaphone terms are indexed
+    under both their primary and secondary codes. The documents of matching
+    terms are read from the index's postings at query time, so the maps hold
+    no copy of them and deleted documents drop out on their own.
+
+    The codes of index terms are kept for as long as the terms are indexed;
+    the codes of other query words go to a bounded LRU cache.
+    """
+
+    def __init__(self, index=None, algorithm="metaphone", build=True, query_cache_size=1024):
+        """
+        Initialize the phonetic search.
+
+        Args:
+            index: The inverted index to search
+            algorithm: The default algorithm: "metaphone", "soundex" or
+                       "double_metaphone"
+            build: Whether to build the phonetic maps from the index right away
+            query_cache_size: The number of query words outside the index
+                              whose codes are cached
+        """
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown phonetic algorithm: {algorithm}")
+
         self.index = index or InvertedIndex()
         self.algorithm = algorithm
-        
-        self.phonetic_index = defaultdict(set)
-        
-        self.doc_phonetic_index = defaultdict(set)
-        
-        self._build_phonetic_indices()
-    
+
+        # algorithm -> code -> terms
+        self.phonetic_indices = {name: defaultdict(set) for name in ALGORITHMS}
+
+        # term -> algorithm -> codes, so each index term is only encoded once
+        self.code_cache = {}
+        self.query_code_cache = LRUCache(query_cache_size)
+
+        if build:
+            self._build_phonetic_indices()
+
+    @property
+    def phonetic_index(self):
+        """The code -> terms map of the default algorithm."""
+        return self.phonetic_indices[self.algorithm]
+
     def _build_phonetic_indices(self):
-        for term, doc_ids in self.index.index.items():
-            phonetic_code = self._get_phonetic_code(term)
-            if phonetic_code:
-                self.phonetic_index[phonetic_code].add(term)
-                
-                self.doc_phonetic_index[phonetic_code].update(doc_ids)
-    
-    def _get_phonetic_code(self, word):
+        self.phonetic_indices = {name: defaultdict(set) for name in ALGORITHMS}
+
+        for term in self.index.index.keys():
+            self._add_term(term)
+
+    def _add_term(self, term):
+        for algorithm, phonetic_codes in self._get_all_phonetic_codes(term).items():
+            for phonetic_code in phonetic_codes:
+                self.phonetic_indices[algorithm][phonetic_code].add(term)
+
+    def add_document(self, doc_id, terms=None):
+        """
+        Add the terms of a newly indexed document to the phonetic maps. Only
+        the document's own terms are encoded, instead of rebuilding the maps
+        for the whole vocabulary.
+
+        Args:
+            doc_id: The document's ID
+            terms: The document's analyzed terms, read from the index if omitted
+        """
+        if terms is None:
+            terms = self.index.term_freqs[doc_id]
+
+        for term in terms:
+            self._add_term(term)
+
+    def remove_document(self, doc_id, terms):
+        """
+        Drop the terms of a deleted document that no longer occur in the
+        index from the phonetic maps. The document itself is no longer in
+        the postings, so it stops matching without further work.
+
+        Args:
+            doc_id: The deleted document's ID
+            terms: The analyzed terms the document contained
+        """
+        for term in terms:
+            if term in self.index.doc_freqs:
+                continue
+            for algorithm, phonetic_codes in self._get_all_phonetic_codes(term).items():
+                for phonetic_code in phonetic_codes:
+                    self.phonetic_indices[algorithm][phonetic_code].discard(term)
+            self.code_cache.pop(term, None)
+
+    def _get_all_phonetic_codes(self, word):
+        phonetic_codes = self.code_cache.get(word)
+        if phonetic_codes is None:
+            phonetic_codes = self.code_cache[word] = {
+                algorithm: self._encode(word, algorithm) for algorithm in ALGORITHMS
+            }
+        return phonetic_codes
+
+    def _get_query_codes(self, word):
+        phonetic_codes = self.code_cache.get(word)
+        if phonetic_codes is None:
+            phonetic_codes = self.query_code_cache.get(word)
+        if phonetic_codes is None:
+            phonetic_codes = {algorithm: self._encode(word, algorithm) for algorithm in ALGORITHMS}
+            self.query_code_cache.put(word, phonetic_codes)
+        return phonetic_codes
+
+    def _get_phonetic_codes(self, word, algorithm=None):
+        return self._get_query_codes(word)[algorithm or self.algorithm]
+
+    def _get_phonetic_code(self, word, algorithm=None):
+        phonetic_codes = self._get_phonetic_codes(word, algorithm)
+        return phonetic_codes[0] if phonetic_codes else None
+
+    def _encode(self, word, algorithm):
         try:
-            if self.algorithm == "metaphone":
-                return phonetics.metaphone(word)
-            elif self.algorithm == "soundex":
-                return phonetics.soundex(word)
-            elif self.algorithm == "double_metaphone":
-                return phonetics.dmetaphone(word)[0]
+            if algorithm == "metaphone":
+                phonetic_codes = (phonetics.metaphone(word),)
+            elif algorithm == "soundex":
+                phonetic_codes = (phonetics.soundex(word),)
             else:
-                # Default to Metaphone
-                return phonetics.metaphone(word)
-        except:
-            return None
-    
-    def search(self, query, limit=10):
-        if self.index.use_lemmatization:
-            query_terms = self.index.tokenizer.lemmatize(query)
-        else:
-            query_terms = self.index.tokenizer.tokenize(query)
-        
+                primary, secondary = phonetics.dmetaphone(word)
+                phonetic_codes = (primary, secondary) if secondary != primary else (primary,)
+        except IndexError:
+            # soundex fails on words that don't start with a letter or contain
+            # characters it has no code for, such as digits and hyphens
+            return ()
+
+        return tuple(phonetic_code for phonetic_code in phonetic_codes if phonetic_code)
+
+    def search(self, query, limit=10, algorithm=None):
+        """
+        Search for documents containing terms that sound like the query terms.
+
+        Args:
+            query: The search query, or an AnalyzedQuery
+            limit: The maximum number of results
+            algorithm: The phonetic algorithm to match with, defaults to the
+                       one given at construction
+
+        Returns:
+            list: (doc_id, content, score) tuples sorted by descending score
+        """
+        algorithm = algorithm or self.algorithm
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown phonetic algorithm: {algorithm}")
+
+        query_terms = self.index.analyze(query)
         if not query_terms:
             return []
-        
+
         matches = {}  # doc_id -> score
-        
+
         for term in query_terms:
-            phonetic_code = self._get_phonetic_code(term)
-            if not phonetic_code:
-                continue
-            
-            doc_ids = self.doc_phonetic_index.get(phonetic_code, set())
-            
+            # A document matching several sound-alike terms, or both double
+            # metaphone codes, still counts once per query term
+            doc_ids = set()
+            for matched_term in self.get_phonetic_matches(term, algorithm):
+                doc_ids.update(self.index.resolve(self.index.get_postings(matched_term)))
+
             for doc_id in doc_ids:
                 if doc_id in matches:
                     matches[doc_id] += 1.0
                 else:
                     matches[doc_id] = 1.0
-        
+
         results = []
         for doc_id, score in matches.items():
             document = self.index.get_document(doc_id)
             results.append((doc_id, document, score))
-        
+
         results.sort(key=lambda x: x[2], reverse=True)
         return results[:limit]
-    
-    def get_phonetic_matches(self, term):
-        phonetic_code = self._get_phonetic_code(term)
-        if not phonetic_code:
-            return set()
-        
-        return self.phonetic_index.get(phonetic_code, set())
\ No newline at end of file
+
+    def save(self, path):
+        """
+        Save the code -> terms maps of every algorithm as JSON.
+
+        Args:
+            path: The file to write
+        """
+        data = {
+            'algorithm': self.algorithm,
+            'phonetic_indices': {
+                algorithm: {code: sorted(terms) for code, terms in phonetic_index.items() if terms}
+                for algorithm, phonetic_index in self.phonetic_indices.items()
+            }
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+    def load(self, path):
+        """
+        Replace the phonetic maps with ones saved by save().
+
+        Args:
+            path: The file to read
+        """
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+
+        self.algorithm = data['algorithm']
+        self.code_cache = {}
+        self.phonetic_indices = {
+            algorithm: defaultdict(set, {code: set(terms) for code, terms in phonetic_index.items()})
+            for algorithm, phonetic_index in data['phonetic_indices'].items()
+        }
+
+    def get_phonetic_matches(self, term, algorithm=None):
+        phonetic_index = self.phonetic_indices[algorithm or self.algorithm]
+
+        matches = set()
+        for phonetic_code in self._get_phonetic_codes(term, algorithm):
+            matches.update(phonetic_index.get(phonetic_code, ()))
+        return matches
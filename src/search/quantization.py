@@ -0,0 +1,104 @@
+import numpy as np
+
+STORAGE_TYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# Quantized rows are converted to float32 this many at a time while scoring,
+# which bounds the temporary memory of a query
+SCORE_CHUNK_SIZE = 16384
+
+
+def quantize(vectors, storage):
+    """
+    Convert L2-normalized float32 rows to a storage type.
+
+    float16 halves the memory of each row. int8 quarters it: every row is
+    scaled so its largest absolute component maps to 127, and the scale is
+    kept to undo the mapping at scoring time.
+
+    Args:
+        vectors: A 2-D float32 array of normalized rows
+        storage: "float32", "float16" or "int8"
+
+    Returns:
+        tuple: The stored rows and the float32 per-row scales (None unless int8)
+    """
+    if storage == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        rows = np.round(vectors / scales[:, None]).astype(np.int8)
+        return rows, scales.astype(np.float32)
+    return vectors.astype(STORAGE_TYPES[storage], copy=False), None
+
+
+def dequantize(rows, scales=None):
+    """
+    Convert stored rows back to approximate float32 vectors.
+
+    Args:
+        rows: Stored rows as returned by quantize()
+        scales: The per-row scales for int8 rows
+
+    Returns:
+        numpy.ndarray: The float32 rows
+    """
+    vectors = np.asarray(rows, dtype=np.float32)
+    if scales is not None:
+        vectors = vectors * np.asarray(scales)[:, None]
+    return vectors
+
+
+def score_rows(matrix, query, scales=None, chunk_size=SCORE_CHUNK_SIZE):
+    """
+    Compute the dot product of every stored row with a query.
+
+    float32 rows are scored with a single matrix-vector product. Quantized
+    rows are scored chunk by chunk, so the float32 copy never exceeds
+    chunk_size rows, and int8 scores are rescaled afterwards, which is
+    cheaper than rescaling the rows.
+
+    Args:
+        matrix: The stored rows
+        query: A float32 query vector
+        scales: The per-row scales for int8 rows
+        chunk_size: The number of rows converted to float32 at a time
+
+    Returns:
+        numpy.ndarray: The float32 score of each row
+    """
+    if matrix.dtype == np.float32:
+        return matrix @ query
+
+    scores = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), chunk_size):
+        block = matrix[start:start + chunk_size]
+        scores[start:start + len(block)] = block.astype(np.float32) @ query
+    if scales is not None:
+        scores *= scales[:len(matrix)]
+    return scores
+
+
+class QuantizedRows:
+    """
+    A read-only view of stored rows that dequantizes the rows it is indexed
+    with, so code written for float32 matrices, such as IVFIndex, can work
+    on quantized ones.
+    """
+
+    def __init__(self, matrix, scales=None):
+        """
+        Initialize the view.
+
+        Args:
+            matrix: The stored rows
+            scales: The per-row scales for int8 rows
+        """
+        self.matrix = matrix
+        self.scales = scales
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def __getitem__(self, rows):
+        if self.scales is None:
+            return np.asarray(self.matrix[rows], dtype=np.float32)
+        return dequantize(self.matrix[rows], self.scales[rows])
@@ -0,0 +1,350 @@
+import re
+from ..indexing.postings import PostingsList, union_all
+
+# Quoted phrases, NEAR/k operators, parentheses and bare words
+TOKEN_PATTERN = re.compile(r'"([^"]*)"|NEAR/(\d+)|(\()|(\))|([^\s()"]+)')
+
+OPERATORS = {"AND", "OR", "NOT"}
+
+
+class Term:
+    def __init__(self, term):
+        self.term = term
+
+
+class Phrase:
+    def __init__(self, terms):
+        self.terms = terms
+
+
+class Near:
+    def __init__(self, first, second, distance):
+        self.first = first
+        self.second = second
+        self.distance = distance
+
+
+class Not:
+    def __init__(self, child):
+        self.child = child
+
+
+class And:
+    def __init__(self, children):
+        self.children = children
+
+
+class Or:
+    def __init__(self, children):
+        self.children = children
+
+
+class ParseState:
+    # The position of one parse in a query's tokens, passed through the
+    # recursive descent so a parser can serve queries on many threads
+    def __init__(self, tokens, default_operator):
+        self.tokens = tokens
+        self.position = 0
+        self.default_operator = default_operator
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][0]
+        return None
+
+    def next(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+
+class AnalyzedQuery:
+    """
+    A query string whose words have been run through the tokenizer once.
+
+    Building one per request and handing it to every engine means the query
+    costs a single spaCy batch however many engines and rankers see it.
+
+    Attributes:
+        text: The original query string, for engines that work on raw text
+        tokens: The lexed query, from which the parser builds its nodes
+        terms: Every analyzed term of the query in order, without operators
+    """
+
+    def __init__(self, text, tokens):
+        self.text = text
+        self.tokens = tokens
+        self.terms = [term for kind, value in tokens if kind == "TEXT" for term in value]
+
+
+class QueryParser:
+    """
+    Parses boolean queries into a tree of query nodes.
+
+    Supported syntax:
+        - AND, OR and NOT operators (upper case), with NOT binding tightest
+          and AND binding tighter than OR
+        - Parentheses for grouping
+        - Quoted phrases, e.g. "machine learning"
+        - Proximity clauses, e.g. data NEAR/3 science
+        - Terms next to each other without an operator are combined with
+          the default operator
+
+    All words of the query are analyzed together in a single spaCy batch, so
+    the resulting nodes hold terms that can be looked up in the index as is.
+    """
+
+    def __init__(self, index):
+        """
+        Initialize the parser.
+
+        Args:
+            index: The inverted index whose tokenizer analyzes the query words
+        """
+        self.index = index
+
+    def analyze(self, query):
+        """
+        Analyze a query string without parsing it yet.
+
+        Args:
+            query: The search query, or an AnalyzedQuery, which is returned as is
+
+        Returns:
+            AnalyzedQuery: The analyzed query
+        """
+        if isinstance(query, AnalyzedQuery):
+            return query
+        return AnalyzedQuery(query, self._lex(query))
+
+    def parse(self, query, default_operator="AND"):
+        """
+        Parse a query.
+
+        Args:
+            query: The search query string, or an AnalyzedQuery, which is
+                   parsed without analyzing its words again
+            default_operator (str): "AND" or "OR", used between terms that
+                                    have no explicit operator
+
+        Returns:
+            The root query node, or None if nothing searchable remains
+        """
+        state = ParseState(self.analyze(query).tokens, default_operator)
+
+        node = self._parse_or(state)
+        # Ignore anything left over, such as an unbalanced closing parenthesis
+        while state.position < len(state.tokens):
+            state.position += 1
+            node = self._combine(default_operator, [node, self._parse_or(state)])
+        return node
+
+    def _lex(self, query):
+        tokens = []
+        texts = []
+
+        for phrase, distance, opening, closing, word in TOKEN_PATTERN.findall(query):
+            if opening:
+                tokens.append(("(", None))
+            elif closing:
+                tokens.append((")", None))
+            elif distance:
+                tokens.append(("NEAR", int(distance)))
+            elif word in OPERATORS:
+                tokens.append((word, None))
+            else:
+                tokens.append(("TEXT", len(texts)))
+                texts.append(word or phrase)
+
+        # Analyze every word and phrase of the query in one batch, skipping
+        # the ones in the tokenizer's analysis cache
+        analyzed = list(self.index.tokenizer.pipe(texts, lemmatize=self.index.use_lemmatization,
+                                                  use_cache=True))
+        return [(kind, analyzed[value]) if kind == "TEXT" else (kind, value)
+                for kind, value in tokens]
+
+    def _parse_or(self, state):
+        children = [self._parse_and(state)]
+        while state.peek() == "OR":
+            state.next()
+            children.append(self._parse_and(state))
+        return self._combine("OR", children)
+
+    def _parse_and(self, state):
+        groups = [[self._parse_not(state)]]
+        while state.peek() not in (None, "OR", ")"):
+            if state.peek() == "AND":
+                state.next()
+                groups[-1].append(self._parse_not(state))
+            elif state.default_operator == "OR" and state.peek() != "NOT":
+                groups.append([self._parse_not(state)])
+            else:
+                groups[-1].append(self._parse_not(state))
+
+        # Implicit OR between juxtaposed terms still binds tighter than an explicit OR
+        return self._combine("OR", [self._combine("AND", group) for group in groups])
+
+    def _parse_not(self, state):
+        if state.peek() == "NOT":
+            state.next()
+            child = self._parse_not(state)
+            return Not(child) if child is not None else None
+        return self._parse_near(state)
+
+    def _parse_near(self, state):
+        value = self._parse_primary(state)
+        while state.peek() == "NEAR":
+            _, distance = state.next()
+            other = self._parse_primary(state)
+            if isinstance(value, list) and isinstance(other, list) and value and other:
+                value = Near(value[-1], other[0], distance)
+            else:
+                # NEAR only applies between two words, otherwise fall back to AND
+                value = self._combine("AND", [self._to_node(value), self._to_node(other)])
+        return self._to_node(value)
+
+    def _parse_primary(self, state):
+        kind = state.peek()
+        if kind is None:
+            return None
+        if kind == "(":
+            state.next()
+            node = self._parse_or(state)
+            if state.peek() == ")":
+                state.next()
+            return node
+        if kind == "TEXT":
+            return state.next()[1]
+        # Stray operator or parenthesis: skip it
+        state.next()
+        return None
+
+    def _to_node(self, value):
+        if not isinstance(value, list):
+            return value
+        if not value:
+            return None
+        if len(value) == 1:
+            return Term(value[0])
+        return Phrase(value)
+
+    def _combine(self, operator, children):
+        children = [child for child in children if child is not None]
+        if not children:
+            return None
+        if len(children) == 1:
+            return children[0]
+        return And(children) if operator == "AND" else Or(children)
+
+
+class QueryPlanner:
+    """
+    Evaluates parsed queries against the index's postings lists.
+
+    Conjunctions are evaluated from the cheapest to the most expensive clause,
+    where the cost of a clause is estimated from postings list sizes, and
+    evaluation stops as soon as the intermediate result is empty. Negated
+    clauses in a conjunction are subtracted from the result at the end.
+    """
+
+    def __init__(self, index):
+        """
+        Initialize the planner.
+
+        Args:
+            index: The inverted index to evaluate queries against
+        """
+        self.index = index
+
+    def evaluate(self, node):
+        """
+        Evaluate a query node.
+
+        Args:
+            node: A query node produced by QueryParser
+
+        Returns:
+            PostingsList: The matching document numbers
+        """
+        if node is None:
+            return PostingsList()
+        if isinstance(node, Term):
+            return self.index.get_postings(node.term)
+        if isinstance(node, Phrase):
+            return self.index.phrase_postings(node.terms)
+        if isinstance(node, Near):
+            return self.index.near_postings(node.first, node.second, node.distance)
+        if isinstance(node, Not):
+            return self._all_documents().difference(self.evaluate(node.child))
+        if isinstance(node, Or):
+            return union_all([self.evaluate(child) for child in node.children])
+        return self._evaluate_and(node)
+
+    def estimate(self, node):
+        """
+        Estimate the number of documents a node matches, from postings sizes only.
+
+        Args:
+            node: A query node
+
+        Returns:
+            int: The estimated number of matching documents
+        """
+        if isinstance(node, Term):
+            return len(self.index.get_postings(node.term))
+        if isinstance(node, Phrase):
+            return min(len(self.index.get_postings(term)) for term in node.terms)
+        if isinstance(node, Near):
+            return min(len(self.index.get_postings(node.first)), len(self.index.get_postings(node.second)))
+        if isinstance(node, Not):
+            return len(self.index.doc_ids) - self.estimate(node.child)
+        if isinstance(node, Or):
+            return sum(self.estimate(child) for child in node.children)
+        return min(self.estimate(child) for child in node.children)
+
+    def positive_terms(self, node):
+        """
+        Collect the terms a document can match on, skipping negated clauses.
+
+        Args:
+            node: A query node
+
+        Returns:
+            list: The terms, in query order
+        """
+        if node is None or isinstance(node, Not):
+            return []
+        if isinstance(node, Term):
+            return [node.term]
+        if isinstance(node, Phrase):
+            return list(node.terms)
+        if isinstance(node, Near):
+            return [node.first, node.second]
+        terms = []
+        for child in node.children:
+            terms.extend(self.positive_terms(child))
+        return terms
+
+    def _evaluate_and(self, node):
+        positives = [child for child in node.children if not isinstance(child, Not)]
+        negatives = [child.child for child in node.children if isinstance(child, Not)]
+
+        if positives:
+            positives.sort(key=self.estimate)
+            result = self.evaluate(positives[0])
+            for child in positives[1:]:
+                if not result:
+                    return result
+                result = result.intersect(self.evaluate(child))
+        else:
+            result = self._all_documents()
+
+        for child in negatives:
+            if not result:
+                break
+            result = result.difference(self.evaluate(child))
+
+        return result
+
+    def _all_documents(self):
+        return PostingsList(range(len(self.index.doc_ids)))
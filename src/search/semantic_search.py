@@ -1,70 +1,543 @@
+import json
+import os
+import threading
+import time
 import numpy as np
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 from ..indexing.inverted_index import InvertedIndex
+from ..indexing.lru_cache import LRUCache
+from .ann import IVFIndex, normalize_rows
+from .quantization import STORAGE_TYPES, QuantizedRows, quantize, score_rows
+
+BACKENDS = ("exact", "ivf")
+
+# Rows the embeddings buffer is first allocated with; it doubles when full
+INITIAL_CAPACITY = 1024
+
+# The IVF centroids are retrained once the collection outgrows the size they
+# were trained on by this factor
+RETRAIN_FACTOR = 2
 
 class SemanticSearch:
-    def __init__(self, index=None, model_name='all-MiniLM-L6-v2'):
+    def __init__(self, index=None, model_name='all-MiniLM-L6-v2', build=True,
+                 backend="exact", n_lists=None, n_probe=8, embedding_cache=None,
+                 deferred=False, encode_batch_size=64, max_pending_seconds=None,
+                 storage="float32", rescore=0, query_cache_size=1024):
+        """
+        Initialize the semantic search.
+        
+        Args:
+            index: The inverted index holding the documents
+            model_name: The SentenceTransformer model to embed documents with
+            build: Whether to embed the index's documents right away
+            backend: "exact" to score every document, or "ivf" for approximate
+                     nearest neighbour search with an IVFIndex
+            n_lists: The number of IVF clusters, defaults to about sqrt(N)
+            n_probe: The number of IVF clusters searched per query; higher
+                     values improve recall at the cost of latency
+            embedding_cache: An optional EmbeddingCache, so documents whose
+                             content was embedded before skip encoding
+            deferred: Whether add_document() queues documents and encodes
+                      them in batches instead of one at a time
+            encode_batch_size: The number of queued documents that triggers
+                               encoding, and the model's batch size
+            max_pending_seconds: Optionally, encode the queue once its oldest
+                                 document has waited this long, checked on
+                                 every add and search
+            storage: How embeddings are kept in memory: "float32", "float16"
+                     or "int8" (per-row scaled); queries are scored directly
+                     on the stored rows
+            rescore: Re-rank this many of the best candidates with exact
+                     float32 embeddings from the embedding cache, to recover
+                     the precision lost to quantization
+            query_cache_size: The number of query embeddings kept in an LRU
+                              cache; 0 disables the cache
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown semantic backend: {backend}")
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown embedding storage: {storage}")
+        if rescore and embedding_cache is None:
+            raise ValueError("Rescoring reads float32 embeddings from an embedding cache")
+        
         self.index = index or InvertedIndex()
+        self.model_name = model_name
+        self.backend = backend
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.ann_index = None  # Built on the first ivf query
+        self.embedding_cache = embedding_cache
+        self.deferred = deferred
+        self.encode_batch_size = encode_batch_size
+        self.max_pending_seconds = max_pending_seconds
+        self.storage = storage
+        self.rescore = rescore
+        
+        # Guards the embeddings, the pending queue and the IVF index, which
+        # ingestion and queries on different threads both update
+        self._lock = threading.RLock()
+        
+        # doc_id -> content of documents that are indexed but not embedded yet
+        self.pending = {}
+        self.pending_since = None
+        
+        # query -> normalized query embedding, cleared when the model changes
+        self.query_cache = LRUCache(query_cache_size)
         
         print(f"Loading semantic model: {model_name}")
         self.model = SentenceTransformer(model_name)
         
-        self.doc_embeddings = {}  # doc_id -> embedding
         self.doc_ids = [] 
-        self.embeddings_matrix = None  
+        self.doc_rows = {}  # doc_id -> row in the embeddings matrix
+        self.deleted_rows = set()  # Tombstoned rows, skipped at query time until compact()
+        
+        # L2-normalized rows of the storage type; only the first len(doc_ids)
+        # rows are in use. int8 rows have a float32 scale each in row_scales
+        self.embeddings_buffer = None
+        self.row_scales = None
         
-        if self.index.documents:
+        if build and self.index.documents:
             self._generate_embeddings()
     
+    @property
+    def model(self):
+        """The SentenceTransformer; assigning a new one clears the query cache."""
+        return self._model
+    
+    @model.setter
+    def model(self, model):
+        self._model = model
+        self.query_cache.clear()
+    
+    @property
+    def embeddings_matrix(self):
+        """The rows in use of the embeddings buffer, or None before the first document."""
+        if self.embeddings_buffer is None:
+            return None
+        return self.embeddings_buffer[:len(self.doc_ids)]
+    
+    def get_embedding(self, doc_id):
+        """
+        Get a document's normalized embedding.
+        
+        Args:
+            doc_id: The document ID
+            
+        Returns:
+            numpy.ndarray: The document's float32 embedding (dequantized when
+                           stored as float16 or int8), or None if it has none
+        """
+        row = self.doc_rows.get(doc_id)
+        if row is None:
+            return None
+        return self._rows()[[row]][0]
+    
+    def _rows(self):
+        """The rows in use as float32 on indexing, whatever the storage type."""
+        scales = self.row_scales[:len(self.doc_ids)] if self.row_scales is not None else None
+        return QuantizedRows(self.embeddings_matrix, scales)
+    
     def _generate_embeddings(self):
         documents = []
-        self.doc_ids = []
+        doc_ids = []
         
         for doc_id, content in self.index.documents.items():
             documents.append(content)
-            self.doc_ids.append(doc_id)
+            doc_ids.append(doc_id)
         
         if documents:
             print(f"Generating embeddings for {len(documents)} documents...")
-            embeddings = self.model.encode(documents, show_progress_bar=True)
+            embeddings = self._encode(documents, show_progress_bar=True)
             
-            self.embeddings_matrix = np.array(embeddings)
-            for i, doc_id in enumerate(self.doc_ids):
-                self.doc_embeddings[doc_id] = embeddings[i]
+            self._append_rows(doc_ids, embeddings)
                 
             print(f"Embeddings generated. Shape: {self.embeddings_matrix.shape}")
     
     def add_document(self, doc_id, content):
-        self.index.add_document(doc_id, content)
+        with self._lock:
+            self.index.add_document(doc_id, content)
+            
+            if not self.deferred:
+                self._append_rows([doc_id], self._encode([content]))
+                return
+            
+            # A re-added document replaces both its old row and any queued version
+            self._tombstone(doc_id)
+            self.pending.pop(doc_id, None)
+            self.pending[doc_id] = content
+            if self.pending_since is None:
+                self.pending_since = time.time()
+            
+            if len(self.pending) >= self.encode_batch_size or self._pending_overdue():
+                self.flush()
+    
+    def flush(self):
+        """Encode every queued document in batches of encode_batch_size."""
+        with self._lock:
+            pending = list(self.pending.items())
+            self.pending = {}
+            self.pending_since = None
+            
+            for start in range(0, len(pending), self.encode_batch_size):
+                self.add_embeddings(pending[start:start + self.encode_batch_size])
+    
+    def _pending_overdue(self):
+        return (self.max_pending_seconds is not None and self.pending_since is not None
+                and time.time() - self.pending_since >= self.max_pending_seconds)
+    
+    def add_documents(self, documents, batch_size=1000, n_process=1):
+        """
+        Add many documents, indexing them and encoding their embeddings in batches.
         
-        embedding = self.model.encode(content)
+        Args:
+            documents: An iterable of (doc_id, content) pairs
+            batch_size: Number of documents processed per batch
+            n_process: Number of processes spaCy uses for the analysis
+        """
+        for batch in self.index.index_batches(documents, batch_size=batch_size, n_process=n_process):
+            self.add_embeddings(batch)
+    
+    def add_embeddings(self, batch):
+        """
+        Encode a batch of documents that are already in the index and append
+        their embeddings to the matrix in a single step.
         
-        self.doc_embeddings[doc_id] = embedding
+        Args:
+            batch: A list of (doc_id, content) pairs
+        """
+        with self._lock:
+            if not batch:
+                return
+            
+            batch_ids = [doc_id for doc_id, _ in batch]
+            for doc_id in batch_ids:
+                self.pending.pop(doc_id, None)
+            embeddings = self._encode([content for _, content in batch])
+            
+            self._append_rows(batch_ids, embeddings)
+    
+    def _encode(self, contents, show_progress_bar=False):
+        """
+        Embed documents, taking the embeddings of previously seen contents
+        from the embedding cache and encoding the rest in one batch.
         
-        if self.embeddings_matrix is None:
-            self.embeddings_matrix = np.array([embedding])
-            self.doc_ids = [doc_id]
-        else:
-            self.embeddings_matrix = np.vstack([self.embeddings_matrix, embedding])
+        Args:
+            contents: The document texts
+            show_progress_bar: Whether the model shows a progress bar
+            
+        Returns:
+            numpy.ndarray: One embedding row per document
+        """
+        if self.embedding_cache is None:
+            return np.asarray(self.model.encode(
+                contents, batch_size=self.encode_batch_size, show_progress_bar=show_progress_bar
+            ), dtype=np.float32)
+        
+        embeddings = self.embedding_cache.get_many(self.model_name, contents)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        
+        if missing:
+            missing_contents = [contents[i] for i in missing]
+            encoded = np.asarray(self.model.encode(
+                missing_contents, batch_size=self.encode_batch_size, show_progress_bar=show_progress_bar
+            ), dtype=np.float32)
+            self.embedding_cache.put_many(self.model_name, missing_contents, encoded)
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = embedding
+        
+        return np.stack(embeddings).astype(np.float32, copy=False)
+    
+    def _append_rows(self, doc_ids, embeddings):
+        start = len(self.doc_ids)
+        embeddings = normalize_rows(embeddings)
+        rows, scales = quantize(embeddings, self.storage)
+        
+        self._reserve(start + len(embeddings), embeddings.shape[1])
+        self.embeddings_buffer[start:start + len(embeddings)] = rows
+        if scales is not None:
+            self.row_scales[start:start + len(embeddings)] = scales
+        
+        for i, doc_id in enumerate(doc_ids):
+            # A re-added document replaces its old row, including one
+            # appended earlier in the same batch
+            self._tombstone(doc_id)
             self.doc_ids.append(doc_id)
+            self.doc_rows[doc_id] = start + i
+        
+        if self.ann_index is not None:
+            self.ann_index.add(range(start, start + len(doc_ids)), embeddings)
+    
+    def _reserve(self, rows, dimensions):
+        # Grow geometrically so appending N rows copies O(N) rows in total
+        capacity = 0 if self.embeddings_buffer is None else len(self.embeddings_buffer)
+        if rows <= capacity:
+            return
+        
+        capacity, used = max(rows, 2 * capacity, INITIAL_CAPACITY), len(self.doc_ids)
+        buffer = np.empty((capacity, dimensions), dtype=STORAGE_TYPES[self.storage])
+        buffer[:used] = self.embeddings_buffer[:used] if used else 0
+        self.embeddings_buffer = buffer
+        
+        if self.storage == "int8":
+            scales = np.ones(capacity, dtype=np.float32)
+            scales[:used] = self.row_scales[:used] if used else 1.0
+            self.row_scales = scales
+    
+    def delete_document(self, doc_id):
+        """
+        Delete a document from the index and tombstone its embedding row.
+        
+        Args:
+            doc_id: The document ID
+            
+        Returns:
+            bool: Whether the document was in the index
+        """
+        with self._lock:
+            self._tombstone(doc_id)
+            self.pending.pop(doc_id, None)
+            return self.index.delete_document(doc_id)
     
-    def search(self, query, top_k=5):
-        if not self.embeddings_matrix is not None:
+    def update_document(self, doc_id, content):
+        """
+        Replace a document's content and embedding.
+        
+        Args:
+            doc_id: The document ID
+            content: The document's new text content
+        """
+        self.add_document(doc_id, content)
+    
+    def compact(self):
+        """Drop the rows of deleted documents from the embeddings matrix."""
+        with self._lock:
+            if not self.deleted_rows:
+                return
+            
+            keep = [row for row in range(len(self.doc_ids)) if row not in self.deleted_rows]
+            self.embeddings_buffer = self.embeddings_buffer[keep]
+            if self.row_scales is not None:
+                self.row_scales = self.row_scales[keep]
+            self.doc_ids = [self.doc_ids[row] for row in keep]
+            self.doc_rows = {doc_id: row for row, doc_id in enumerate(self.doc_ids)}
+            self.deleted_rows = set()
+            # Row numbers changed, so the IVF lists are rebuilt on the next query
+            self.ann_index = None
+    
+    def _tombstone(self, doc_id):
+        row = self.doc_rows.pop(doc_id, None)
+        if row is not None:
+            self.deleted_rows.add(row)
+    
+    def save(self, directory):
+        """
+        Save the embeddings matrix as .npy in its storage type, int8 row
+        scales as a second .npy, and the row order as JSON. Deleted rows are
+        left out.
+        
+        Args:
+            directory: The directory to write the files to
+        """
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            
+            self.flush()
+            if self.embedding_cache is not None:
+                self.embedding_cache.flush()
+            
+            keep = [row for row in range(len(self.doc_ids)) if row not in self.deleted_rows]
+            
+            with open(os.path.join(directory, 'embedding_doc_ids.json'), 'w', encoding='utf-8') as f:
+                json.dump([self.doc_ids[row] for row in keep], f)
+            
+            if self.embeddings_matrix is not None:
+                np.save(os.path.join(directory, 'embeddings.npy'), self.embeddings_matrix[keep])
+                if self.row_scales is not None:
+                    np.save(os.path.join(directory, 'row_scales.npy'), self.row_scales[keep])
+    
+    def load(self, directory):
+        """
+        Load embeddings saved by save(). The matrix is memory-mapped read-only
+        and only copied into memory once new documents are added. The storage
+        type becomes the one the embeddings were saved with.
+        
+        Args:
+            directory: The directory holding the files
+        """
+        with self._lock:
+            with open(os.path.join(directory, 'embedding_doc_ids.json'), encoding='utf-8') as f:
+                self.doc_ids = json.load(f)
+            
+            matrix_path = os.path.join(directory, 'embeddings.npy')
+            scales_path = os.path.join(directory, 'row_scales.npy')
+            if os.path.exists(matrix_path):
+                self.embeddings_buffer = np.load(matrix_path, mmap_mode='r')
+                self.storage = np.dtype(self.embeddings_buffer.dtype).name
+            else:
+                self.embeddings_buffer = None
+            self.row_scales = np.load(scales_path) if os.path.exists(scales_path) else None
+            
+            self.doc_rows = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+            self.deleted_rows = set()
+            self.ann_index = None
+    
+    def build_ann_index(self):
+        """Train the IVF index on the current embeddings and file every live row."""
+        with self._lock:
+            self.ann_index = IVFIndex(n_lists=self.n_lists, n_probe=self.n_probe)
+            self.ann_index.train(self._rows())
+            
+            live_rows = [row for row in range(len(self.doc_ids)) if row not in self.deleted_rows]
+            self.ann_index.add(live_rows, self._rows()[live_rows])
+    
+    def _snapshot(self, query_embedding, n_probe):
+        # Called with the lock held. Rows below len(doc_ids) are never
+        # written again and doc_ids is only appended to (compact() and load()
+        # replace both), so a view of the rows and a reference to doc_ids
+        # stay valid while documents are added; the tombstones are copied.
+        # For the ivf backend, the candidate rows are collected here too,
+        # since the IVF lists grow in place
+        ann_index = self.ann_index
+        candidate_rows = None
+        if self.backend == "ivf":
+            if ann_index is None or len(self.doc_ids) > RETRAIN_FACTOR * ann_index.trained_size:
+                self.build_ann_index()
+            candidate_rows = self.ann_index.candidates(query_embedding, n_probe)
+        
+        return self._rows(), self.doc_ids, frozenset(self.deleted_rows), candidate_rows
+    
+    def _search_ann(self, query_embedding, top_k, snapshot):
+        rows, doc_ids, deleted_rows, candidate_rows = snapshot
+        
+        # Ask for enough rows to still have top_k after skipping deleted ones
+        found, scores = IVFIndex.score(rows, query_embedding, candidate_rows, top_k + len(deleted_rows))
+        
+        results = []
+        for row, score in zip(found.tolist(), scores.tolist()):
+            if row in deleted_rows:
+                continue
+            doc_id = doc_ids[row]
+            results.append((doc_id, self.index.get_document(doc_id), score))
+            if len(results) == top_k:
+                break
+        return results
+    
+    def search(self, query, top_k=5, n_probe=None):
+        """
+        Find the documents most similar to the query by cosine similarity.
+        
+        Args:
+            query: The search query, or an AnalyzedQuery, whose original text
+                   is embedded
+            top_k: The number of results
+            n_probe: The number of IVF clusters to search with the ivf backend,
+                     overriding the default for this query
+            
+        Returns:
+            list: (doc_id, content, score) tuples sorted by descending score
+        """
+        if top_k <= 0:
             return []
         
-        query_embedding = self.model.encode(query)
+        # Encoding the query and scoring it are the slow parts, so both run
+        # outside the lock, which is only held to flush an overdue queue and
+        # take a snapshot of the rows; concurrent queries score in parallel
+        query_embedding = None
+        if self.doc_rows or self._pending_overdue():
+            text = query if isinstance(query, str) else query.text
+            query_embedding = self._encode_query(text)
         
-        similarity_scores = cosine_similarity(
-            [query_embedding], 
-            self.embeddings_matrix
-        )[0]
+        with self._lock:
+            if self._pending_overdue():
+                self.flush()
+            
+            snapshot = None
+            if self.doc_rows and query_embedding is not None:
+                snapshot = self._snapshot(query_embedding, n_probe)
+            pending = dict(self.pending)
         
-        top_indices = np.argsort(similarity_scores)[::-1][:top_k]
+        results = []
+        if snapshot is not None:
+            candidates = max(top_k, self.rescore)
+            if self.backend == "ivf":
+                results = self._search_ann(query_embedding, candidates, snapshot)
+            else:
+                results = self._search_exact(query_embedding, candidates, snapshot)
+            
+            if self.rescore:
+                results = self._rescore(query_embedding, results)
+            results = results[:top_k]
+        
+        if pending:
+            results.extend(self._search_pending(query, pending))
+            results.sort(key=lambda x: x[2], reverse=True)
+            results = results[:top_k]
+        
+        return results
+    
+    def _encode_query(self, query):
+        query_embedding = self.query_cache.get(query)
+        if query_embedding is None:
+            query_embedding = normalize_rows(np.asarray(self.model.encode(query)).reshape(1, -1))[0]
+            # Shared between calls, so it must never be modified in place
+            query_embedding.flags.writeable = False
+            self.query_cache.put(query, query_embedding)
+        return query_embedding
+    
+    def _search_pending(self, query, pending):
+        # Queued documents have no embedding yet, so they are scored lexically
+        # by the fraction of distinct query terms they contain
+        query_terms = set(self.index.analyze(query))
+        if not query_terms:
+            return []
+        
+        results = []
+        for doc_id, content in pending.items():
+            doc_terms = self.index.term_freqs.get(doc_id, {})
+            matched = sum(1 for term in query_terms if term in doc_terms)
+            if matched:
+                results.append((doc_id, content, matched / len(query_terms)))
+        return results
+    
+    def _rescore(self, query_embedding, results):
+        # Exact float32 scores for candidates found on quantized rows; a
+        # candidate the cache doesn't know keeps its approximate score
+        contents = [content for _, content, _ in results]
+        with self._lock:
+            # The cache is updated by ingestion on other threads
+            cached = self.embedding_cache.get_many(self.model_name, contents)
+        
+        rescored = []
+        for (doc_id, content, approximate), embedding in zip(results, cached):
+            if embedding is not None:
+                embedding = normalize_rows(np.asarray(embedding).reshape(1, -1))[0]
+                approximate = float(embedding @ query_embedding)
+            rescored.append((doc_id, content, approximate))
+        
+        rescored.sort(key=lambda x: x[2], reverse=True)
+        return rescored
+    
+    def _search_exact(self, query_embedding, top_k, snapshot):
+        rows, doc_ids, deleted_rows, _ = snapshot
+        
+        # Rows are normalized at insert, so cosine similarity is a plain dot
+        # product, computed directly on the stored (possibly quantized) rows
+        similarity_scores = score_rows(rows.matrix, query_embedding, rows.scales)
+        
+        if deleted_rows:
+            similarity_scores[list(deleted_rows)] = -np.inf
+        
+        if top_k < len(similarity_scores):
+            top_indices = np.argpartition(-similarity_scores, top_k - 1)[:top_k]
+        else:
+            top_indices = np.arange(len(similarity_scores))
+        top_indices = top_indices[np.argsort(-similarity_scores[top_indices])]
         
         results = []
         for idx in top_indices:
-            doc_id = self.doc_ids[idx]
+            if idx in deleted_rows:
+                continue
+            doc_id = doc_ids[idx]
             document = self.index.get_document(doc_id)
             score = similarity_scores[idx]
             results.append((doc_id, document, float(score)))
@@ -0,0 +1,124 @@
+from .edit_distance import bounded_levenshtein
+
+
+class DeletionIndex:
+    """
+    A SymSpell-style index of the deletion neighbourhoods of terms.
+
+    Every term is stored under each string obtained by deleting up to
+    max_distance characters from it. Two strings within max_distance edits of
+    each other always share such a deletion variant, so a lookup only has to
+    generate the variants of the query word, probe the dict for each and
+    verify the few candidates it finds.
+
+    Only the first prefix_length characters of a term are used to generate
+    its variants, which bounds the number of variants of long terms. Shorter
+    prefixes use less memory but return more candidates to verify.
+    """
+
+    def __init__(self, terms=(), max_distance=2, prefix_length=7):
+        """
+        Initialize the deletion index.
+
+        Args:
+            terms: An optional iterable of terms to index
+            max_distance: The largest edit distance lookups can use
+            prefix_length: The number of leading characters variants are
+                           generated from
+        """
+        if prefix_length <= max_distance:
+            raise ValueError("prefix_length must be larger than max_distance")
+
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.deletes = {}  # deletion variant -> set of terms
+        self.terms = set()
+        for term in terms:
+            self.add(term)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __contains__(self, term):
+        return term in self.terms
+
+    def add(self, term):
+        """
+        Index a term under all of its deletion variants.
+
+        Args:
+            term: The term to add
+        """
+        if term in self.terms:
+            return
+
+        self.terms.add(term)
+        for variant in self._variants(term[:self.prefix_length], self.max_distance):
+            entry = self.deletes.get(variant)
+            if entry is None:
+                entry = self.deletes[variant] = set()
+            entry.add(term)
+
+    def remove(self, term):
+        """
+        Remove a term.
+
+        Args:
+            term: The term to remove
+
+        Returns:
+            bool: Whether the term was indexed
+        """
+        if term not in self.terms:
+            return False
+
+        self.terms.discard(term)
+        for variant in self._variants(term[:self.prefix_length], self.max_distance):
+            entry = self.deletes.get(variant)
+            if entry is not None:
+                entry.discard(term)
+                if not entry:
+                    del self.deletes[variant]
+        return True
+
+    def lookup(self, word, max_distance=None):
+        """
+        Find all terms within max_distance edits of a word.
+
+        Args:
+            word: The query word
+            max_distance: The maximum edit distance, at most the index's own
+                          max_distance (the default)
+
+        Returns:
+            list: (term, distance) tuples, in no particular order
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        if max_distance > self.max_distance:
+            raise ValueError(f"The deletion index only supports distances up to {self.max_distance}")
+
+        results = []
+        seen = set()
+        for variant in self._variants(word[:self.prefix_length], max_distance):
+            # Copied in one step, so terms can be added while a lookup runs
+            for term in tuple(self.deletes.get(variant, ())):
+                if term in seen:
+                    continue
+                seen.add(term)
+
+                if abs(len(term) - len(word)) > max_distance:
+                    continue
+                distance = bounded_levenshtein(word, term, max_distance)
+                if distance <= max_distance:
+                    results.append((term, distance))
+
+        return results
+
+    def _variants(self, text, distance):
+        variants = {text}
+        frontier = {text}
+        for _ in range(distance):
+            frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+            variants |= frontier
+        return variants
@@ -0,0 +1,132 @@
+class TrieNode:
+    __slots__ = ("children", "term")
+
+    def __init__(self):
+        self.children = {}
+        self.term = None  # Set on the node where an indexed term ends
+
+
+class TermTrie:
+    """
+    A character trie over index terms that finds every term within an edit
+    distance of a query word in a single walk.
+
+    The walk computes one row of the Levenshtein DP table per trie node, so
+    terms sharing a prefix share the work for it. Since the smallest value in
+    a row never decreases further down the trie, a whole subtree is skipped
+    as soon as its row minimum exceeds the maximum distance.
+    """
+
+    def __init__(self, terms=()):
+        """
+        Initialize the trie.
+
+        Args:
+            terms: An optional iterable of terms to insert
+        """
+        self.root = TrieNode()
+        self._size = 0
+        for term in terms:
+            self.insert(term)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, term):
+        node = self._find(term)
+        return node is not None and node.term is not None
+
+    def insert(self, term):
+        """
+        Insert a term.
+
+        Args:
+            term: The term to insert
+        """
+        node = self.root
+        for char in term:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = TrieNode()
+            node = child
+
+        if node.term is None:
+            node.term = term
+            self._size += 1
+
+    def remove(self, term):
+        """
+        Remove a term, pruning nodes that no longer lead to any term.
+
+        Args:
+            term: The term to remove
+
+        Returns:
+            bool: Whether the term was in the trie
+        """
+        path = [self.root]
+        for char in term:
+            node = path[-1].children.get(char)
+            if node is None:
+                return False
+            path.append(node)
+
+        if path[-1].term is None:
+            return False
+
+        path[-1].term = None
+        self._size -= 1
+
+        for depth in range(len(term), 0, -1):
+            node = path[depth]
+            if node.term is not None or node.children:
+                break
+            del path[depth - 1].children[term[depth - 1]]
+        return True
+
+    def search(self, word, max_distance):
+        """
+        Find all terms within max_distance edits of a word.
+
+        Args:
+            word: The query word
+            max_distance: The maximum Levenshtein distance
+
+        Returns:
+            list: (term, distance) tuples, in no particular order
+        """
+        columns = len(word) + 1
+        results = []
+        if self.root.term is not None and len(word) <= max_distance:
+            results.append((self.root.term, len(word)))
+
+        # Children are copied in one step before they are walked, so terms
+        # can be inserted or removed while a search runs
+        stack = [(child, char, list(range(columns))) for char, child in list(self.root.children.items())]
+        while stack:
+            node, char, previous_row = stack.pop()
+
+            row = [previous_row[0] + 1]
+            for column in range(1, columns):
+                row.append(min(
+                    row[column - 1] + 1,  # insertion
+                    previous_row[column] + 1,  # deletion
+                    previous_row[column - 1] + (word[column - 1] != char)  # substitution
+                ))
+
+            if node.term is not None and row[-1] <= max_distance:
+                results.append((node.term, row[-1]))
+
+            if min(row) <= max_distance:
+                for child_char, child in list(node.children.items()):
+                    stack.append((child, child_char, row))
+
+        return results
+
+    def _find(self, term):
+        node = self.root
+        for char in term:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
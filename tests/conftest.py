@@ -0,0 +1,56 @@
+import os
+import sys
+import zlib
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.indexing.inverted_index import InvertedIndex
+from src.indexing.tokenizer import Tokenizer
+
+
+@pytest.fixture(scope="session")
+def tokenizer():
+    # A blank pipeline only tokenizes, so the tests don't need a trained model
+    return Tokenizer(language_model="blank:en")
+
+
+@pytest.fixture
+def index(tokenizer):
+    return InvertedIndex(tokenizer=tokenizer, use_lemmatization=False, background_merge=False)
+
+
+class HashingEncoder:
+    """A deterministic bag-of-words stand-in for a SentenceTransformer."""
+
+    dimensions = 64
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False, **kwargs):
+        single = isinstance(texts, str)
+        rows = np.zeros((1 if single else len(texts), self.dimensions), dtype=np.float32)
+        for row, text in zip(rows, [texts] if single else texts):
+            for word in text.lower().split():
+                row[zlib.crc32(word.encode()) % self.dimensions] += 1.0
+        return rows[0] if single else rows
+
+
+@pytest.fixture
+def combined_search(index):
+    pytest.importorskip("sentence_transformers")
+    from src.search.combined_search import CombinedSearch
+
+    search = CombinedSearch(index=index)
+    search.semantic_search.model = HashingEncoder()
+    return search
+
+
+@pytest.fixture
+def semantic_search(index):
+    pytest.importorskip("sentence_transformers")
+    from src.search.semantic_search import SemanticSearch
+
+    search = SemanticSearch(index=index)
+    search.model = HashingEncoder()
+    return search
@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+from src.ranking.bm25 import BM25Ranker
+
+WORDS = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta"]
+
+
+@pytest.fixture
+def ranker(index):
+    # Short documents over a small vocabulary, so many documents tie and
+    # most match only some of the query terms
+    rng = random.Random(0)
+    for doc_id in range(300):
+        index.add_document(doc_id, " ".join(rng.choices(WORDS, k=rng.randint(1, 4))))
+    return BM25Ranker(index)
+
+
+def expected_top_k(ranker, query_terms, k, doc_ids):
+    scores = ranker.rank(query_terms, doc_ids)
+    return sorted((score for score in scores.values() if score > 0), reverse=True)[:k]
+
+
+@pytest.mark.parametrize("k", [1, 5, 10, 50])
+def test_top_k_matches_rank(ranker, k):
+    rng = random.Random(k)
+    all_docs = list(ranker.index.term_freqs)
+
+    for _ in range(100):
+        query_terms = rng.sample(WORDS, rng.randint(1, 4))
+        results = ranker.top_k(query_terms, k)
+
+        expected = expected_top_k(ranker, query_terms, k, all_docs)
+        assert [score for _, score in results] == pytest.approx(expected)
+        for doc_id, score in results:
+            assert ranker.rank(query_terms, [doc_id])[doc_id] == pytest.approx(score)
+
+
+@pytest.mark.parametrize("k", [1, 10])
+def test_top_k_with_candidates_matches_rank(ranker, k):
+    rng = random.Random(k)
+    all_docs = list(ranker.index.term_freqs)
+
+    for _ in range(100):
+        query_terms = rng.sample(WORDS, rng.randint(1, 3))
+        candidates = set(rng.sample(all_docs, 60))
+        results = ranker.top_k(query_terms, k, candidates=candidates)
+
+        expected = expected_top_k(ranker, query_terms, k, candidates)
+        assert [score for _, score in results] == pytest.approx(expected)
+        assert all(doc_id in candidates for doc_id, _ in results)
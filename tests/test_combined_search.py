@@ -0,0 +1,10 @@
+def test_duplicate_ids_in_one_batch_keep_only_the_last_version(combined_search):
+    combined_search.add_documents([(1, "alpha beta"), (2, "gamma delta"), (1, "epsilon zeta")])
+
+    semantic = combined_search.semantic_search
+    assert len(semantic.deleted_rows) == 1
+    assert [doc_id for doc_id, _, _ in semantic.search("alpha beta")].count(1) <= 1
+    assert semantic.search("epsilon zeta", top_k=1)[0][:2] == (1, "epsilon zeta")
+
+    assert combined_search.search("alpha", mode="phonetic") == []
+    assert combined_search.search("alpah", mode="fuzzy") == []
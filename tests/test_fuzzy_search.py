@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from src.search.fuzzy_search import FuzzySearch
+
+
+@pytest.fixture
+def fuzzy_search(index):
+    for doc_id, content in enumerate(["quick brown fox", "lazy dog", "slow turtle"]):
+        index.add_document(doc_id, content)
+    return FuzzySearch(index=index, backend="trie")
+
+
+def test_slow_query_does_not_block_a_fast_one(fuzzy_search):
+    fuzzy_search.build_trie()
+    trie = fuzzy_search.trie
+    search = trie.search
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking_search(word, max_distance):
+        if word == "slow":
+            started.set()
+            release.wait(5)
+        return search(word, max_distance)
+
+    trie.search = blocking_search
+    slow = threading.Thread(target=fuzzy_search.search, args=("slow",))
+    slow.start()
+    try:
+        assert started.wait(5)
+        fast = threading.Thread(target=fuzzy_search.search, args=("quikc",))
+        fast.start()
+        fast.join(2)
+        assert not fast.is_alive()
+    finally:
+        release.set()
+        slow.join()
+
+
+@pytest.mark.parametrize("backend", ["bktree", "trie", "symspell", "linear"])
+def test_queries_match_while_terms_are_added(fuzzy_search, backend):
+    fuzzy_search.backend = backend
+    index = fuzzy_search.index
+    stop = threading.Event()
+
+    def ingest():
+        doc_id = 100
+        while not stop.is_set():
+            index.add_document(doc_id, f"term{doc_id} quack")
+            fuzzy_search.add_terms(index.term_freqs[doc_id])
+            doc_id += 1
+
+    writer = threading.Thread(target=ingest)
+    writer.start()
+    try:
+        for _ in range(200):
+            assert 0 in {doc_id for doc_id, _, _ in fuzzy_search.search("quikc")}
+    finally:
+        stop.set()
+        writer.join()
+
+
+def test_symspell_rejects_a_prefix_no_longer_than_max_distance(index):
+    with pytest.raises(ValueError):
+        FuzzySearch(index=index, backend="symspell", max_distance=2, prefix_length=2)
+    FuzzySearch(index=index, backend="trie", max_distance=2, prefix_length=2)
@@ -0,0 +1,14 @@
+def test_index_batches_reports_versions_replaced_within_a_batch(index):
+    index.add_document(1, "alpha beta")
+    documents = [(2, "gamma delta"), (1, "epsilon zeta"), (1, "eta theta")]
+
+    batches = list(index.index_batches(documents, batch_size=10, with_replaced=True))
+
+    assert len(batches) == 1
+    batch, replaced = batches[0]
+    assert batch == documents
+    assert replaced == {1: {"alpha", "beta", "epsilon", "zeta"}}
+    assert index.documents[1] == "eta theta"
+    for term in ["alpha", "beta", "epsilon", "zeta"]:
+        assert term not in index.doc_freqs
+        assert index.resolve(index.get_postings(term)) == []
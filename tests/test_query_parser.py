@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.search.query_parser import And, Near, Not, Or, Phrase, QueryParser, Term
+
+QUERIES = [
+    'alpha AND (beta OR gamma)',
+    '"alpha beta" NOT gamma',
+    'alpha NEAR/2 beta OR delta',
+    'alpha beta OR gamma delta',
+    'NOT (alpha OR beta) epsilon)',
+]
+
+
+def describe(node):
+    if node is None:
+        return None
+    if isinstance(node, Term):
+        return node.term
+    if isinstance(node, Phrase):
+        return ("PHRASE", tuple(node.terms))
+    if isinstance(node, Near):
+        return ("NEAR", node.first, node.second, node.distance)
+    if isinstance(node, Not):
+        return ("NOT", describe(node.child))
+    operator = "AND" if isinstance(node, And) else "OR"
+    return (operator, tuple(describe(child) for child in node.children))
+
+
+def test_parse(index):
+    parser = QueryParser(index)
+
+    assert describe(parser.parse(QUERIES[0])) == ("AND", ("alpha", ("OR", ("beta", "gamma"))))
+    assert describe(parser.parse(QUERIES[1])) == ("AND", (("PHRASE", ("alpha", "beta")), ("NOT", "gamma")))
+    assert describe(parser.parse(QUERIES[2])) == ("OR", (("NEAR", "alpha", "beta", 2), "delta"))
+    assert describe(parser.parse(QUERIES[3])) == ("OR", (("AND", ("alpha", "beta")), ("AND", ("gamma", "delta"))))
+    assert describe(parser.parse(QUERIES[4], default_operator="OR")) == ("OR", (("NOT", ("OR", ("alpha", "beta"))), "epsilon"))
+
+
+def test_parse_from_many_threads(index):
+    parser = QueryParser(index)
+    expected = [describe(parser.parse(query)) for query in QUERIES]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        parsed = list(executor.map(lambda query: describe(parser.parse(query)), QUERIES * 200))
+
+    assert parsed == expected * 200
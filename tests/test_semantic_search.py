@@ -0,0 +1,44 @@
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def populated(semantic_search):
+    documents = [(doc_id, f"document {doc_id} about paris") for doc_id in range(50)]
+    semantic_search.add_documents(documents)
+    return semantic_search
+
+
+def test_slow_query_does_not_block_a_fast_one(populated, monkeypatch):
+    import src.search.semantic_search as semantic_module
+
+    score_rows = semantic_module.score_rows
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def blocking_score_rows(*args, **kwargs):
+        calls.append(None)
+        if len(calls) == 1:
+            started.set()
+            release.wait(5)
+        return score_rows(*args, **kwargs)
+
+    monkeypatch.setattr(semantic_module, "score_rows", blocking_score_rows)
+    slow = threading.Thread(target=populated.search, args=("slow query",))
+    slow.start()
+    try:
+        assert started.wait(5)
+        fast = threading.Thread(target=populated.search, args=("document about paris",))
+        fast.start()
+        fast.join(2)
+        assert not fast.is_alive()
+    finally:
+        release.set()
+        slow.join()
+
+
+def test_deleted_documents_stay_out_of_results(populated):
+    populated.delete_document(3)
+    assert 3 not in {doc_id for doc_id, _, _ in populated.search("document 3 about paris", top_k=50)}
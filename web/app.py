@@ -5,7 +5,9 @@ import time
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.search.combined_search import CombinedSearch
+from src.search.combined_search import CombinedSearch, ENGINES
+from src.search.edit_distance import batch_levenshtein
+from src.search.embedding_cache import EmbeddingCache
 from src.indexing.inverted_index import InvertedIndex
 from src.indexing.tokenizer import Tokenizer
 
@@ -32,14 +34,36 @@ sample_documents = [
     "Prashant has been working pretty hard."
 ]
 
+# Directory to persist the built engine to, so later starts can skip indexing
+INDEX_DIR = os.environ.get('SEARCH_INDEX_DIR')
+
+# Directory of the embedding cache, so restarts skip re-encoding unchanged documents
+EMBEDDING_CACHE_DIR = os.environ.get('SEARCH_EMBEDDING_CACHE_DIR')
+
+# Seconds a query waits for each engine; engines that miss it are left out and reported
+ENGINE_DEADLINE = os.environ.get('SEARCH_ENGINE_DEADLINE')
+DEADLINES = {engine: float(ENGINE_DEADLINE) for engine in ENGINES} if ENGINE_DEADLINE else None
+
 def initialize_search_engine():
     print("Initializing search engine...")
-    tokenizer = Tokenizer(remove_stopwords=True)
+    tokenizer = Tokenizer(remove_stopwords=True, pipeline="fast")
+    embedding_cache = EmbeddingCache(EMBEDDING_CACHE_DIR) if EMBEDDING_CACHE_DIR else None
+    
+    if INDEX_DIR and os.path.isdir(INDEX_DIR):
+        search = CombinedSearch.load(INDEX_DIR, tokenizer=tokenizer, embedding_cache=embedding_cache)
+        print(f"Search engine loaded from {INDEX_DIR}.")
+        return search
+    
     index = InvertedIndex(tokenizer=tokenizer)
-    search = CombinedSearch(index=index)
+    search = CombinedSearch(index=index, embedding_cache=embedding_cache)
+    
+    search.add_documents(enumerate(sample_documents))
     
-    for i, doc in enumerate(sample_documents):
-        search.add_document(i, doc)
+    if INDEX_DIR:
+        search.save(INDEX_DIR)
+    elif embedding_cache is not None:
+        # save() writes the cache's pending shard; without it, write it here
+        embedding_cache.flush()
     
     print("Search engine initialized with sample documents.")
     return search
@@ -61,7 +85,7 @@ def search():
     
     start_time = time.time()
     
-    results = search_engine.search(query, mode=mode, limit=10)
+    results, timed_out = search_engine.search_with_timeouts(query, mode=mode, limit=10, deadlines=DEADLINES)
     
     search_time = time.time() - start_time
     
@@ -78,6 +102,7 @@ def search():
         'results': formatted_results,
         'query': query,
         'mode': mode,
+        'timed_out': timed_out,
         'search_time': round(search_time * 1000, 2)  # Convert to milliseconds
     })
     
@@ -92,10 +117,7 @@ def process():
     
     processes = []
     
-    if search_engine.index.use_lemmatization:
-        basic_tokens = search_engine.index.tokenizer.lemmatize(query)
-    else:
-        basic_tokens = search_engine.index.tokenizer.tokenize(query)
+    basic_tokens = search_engine.index.analyze(query)
     
     basic_process = {
         'technique': 'basic',
@@ -107,7 +129,7 @@ def process():
     
     matching_docs = []
     for token in basic_tokens:
-        docs = search_engine.index.lookup(token)
+        docs = search_engine.index.resolve(search_engine.index.get_postings(token))
         matching_docs.extend(list(docs))
     
     if matching_docs:
@@ -127,10 +149,10 @@ def process():
     }
     
     fuzzy_matches = []
-    all_terms = set(search_engine.index.index.keys())
+    all_terms = list(search_engine.index.index.keys())
     for token in basic_tokens:
-        for term in all_terms:
-            distance = search_engine.fuzzy_search._levenshtein_distance(token, term)
+        distances = batch_levenshtein(token, all_terms, 2)
+        for term, distance in zip(all_terms, distances.tolist()):
             if 0 < distance <= 2: 
                 fuzzy_matches.append((term, distance))
                 if len(fuzzy_matches) >= 3:  
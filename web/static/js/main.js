@@ -184,7 +184,9 @@ document.addEventListener("DOMContentLoaded", function () {
   function displayResults(data) {
     const results = data.results;
     resultsCount.textContent = `(${results.length})`;
-    searchTime.textContent = data.search_time;
+    searchTime.textContent = data.timed_out && data.timed_out.length
+      ? `${data.search_time} (timed out: ${data.timed_out.join(", ")})`
+      : data.search_time;
 
     if (results.length === 0) {
       resultsList.innerHTML = `